@@ -1,12 +1,17 @@
-from .compression import compression_ratio
-from .patterns.Token import token_patterns
-from .patterns.part_of_speech import pos_patterns, get_pos
+from .compression import (compression_ratio, compression_ratios, document_compression_ratios,
+                          windowed_compression_ratios, register_compressor)
+from .corpus import Corpus, as_corpus, split_sentences
+from .pairwise_store import PairwiseScoreStore
+from .patterns.Token import token_patterns, streaming_token_patterns, TokenPatternCounter
+from .patterns.part_of_speech import pos_patterns, pos_patterns_many, get_pos, get_pipeline, PosCache
 from .utils.memoize import memoized
-from .homogenization import homogenization_score
-from .ngram_diversity import ngram_diversity_score
+from .utils.aho_corasick import AhoCorasick
+from .homogenization import (homogenization_score, sampled_homogenization_score, HomogenizationEstimate,
+                             cross_homogenization_score, HomogenizationPool)
+from .ngram_diversity import ngram_diversity_score, streaming_ngram_diversity_score, NgramDiversityCounter
 from .functions import extract_patterns, match_patterns
-from .self_repetition import self_repetition_score
-from .template import template_rate, templates_per_token
+from .self_repetition import self_repetition_score, SelfRepetitionIndex
+from .template import template_rate, templates_per_token, streaming_templates_per_token, TemplateLibrary
 from .qudsim import qudsim
-from .embedding import remote_clique, chamfer_dist
-from .compute_all_metrics import compute_all_metrics
\ No newline at end of file
+from .embedding import remote_clique, chamfer_dist, get_embeddings, get_model, EmbeddingCache
+from .compute_all_metrics import compute_all_metrics, MetricResults
\ No newline at end of file
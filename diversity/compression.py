@@ -1,59 +1,297 @@
-from typing import List, Optional
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 from pathlib import Path
 
-import tempfile
-import gzip
-import os
+import bz2
+import importlib
+import zlib
 import lzma as xz
+from collections import deque
+
+
+class _Compressor:
+    """ Adapts a codec to the `compress(chunk)` / `flush()` interface of `zlib.compressobj`. """
+
+    def __init__(self, compress: Callable[[bytes], bytes], flush: Callable[[], bytes], header: bytes = b''):
+        self._compress = compress
+        self._flush = flush
+        self._header = header
+
+    def compress(self, chunk: bytes) -> bytes:
+        header, self._header = self._header, b''
+        return header + self._compress(chunk)
+
+    def flush(self) -> bytes:
+        return self._header + self._flush()
+
+
+def _optional_import(module: str, package: str, algorithm: str):
+    try:
+        return importlib.import_module(module)
+    except ImportError:
+        raise ImportError(f"`{algorithm}` compression requires the `{package}` package (pip install {package}).")
+
+
+def _zstd(level: Optional[int], threads: int):
+    zstandard = _optional_import('zstandard', 'zstandard', 'zstd')
+    return zstandard.ZstdCompressor(level=3 if level is None else level, threads=threads).compressobj()
+
+
+def _lz4(level: Optional[int], threads: int):
+    frame = _optional_import('lz4.frame', 'lz4', 'lz4')
+    compressor = frame.LZ4FrameCompressor(compression_level=0 if level is None else level)
+    return _Compressor(compressor.compress, compressor.flush, header=compressor.begin())
+
+
+def _brotli(level: Optional[int], threads: int):
+    brotli = _optional_import('brotli', 'brotli', 'brotli')
+    compressor = brotli.Compressor(quality=11 if level is None else level)
+    return _Compressor(compressor.process, compressor.finish)
+
+
+# algorithm -> (factory(level, threads) returning a streaming compressor, file extension)
+# the defaults match `gzip.compress`, `lzma.open` and `bz2.open`
+COMPRESSORS: Dict[str, Tuple[Callable[[Optional[int], int], object], str]] = {
+    'gzip': (lambda level, threads: zlib.compressobj(9 if level is None else level, zlib.DEFLATED, 31), 'gz'),
+    'xz': (lambda level, threads: xz.LZMACompressor(preset=level), 'xz'),
+    'bz2': (lambda level, threads: bz2.BZ2Compressor(9 if level is None else level), 'bz2'),
+    'zstd': (_zstd, 'zst'),
+    'lz4': (_lz4, 'lz4'),
+    'brotli': (_brotli, 'br'),
+}
+
+
+def register_compressor(
+        name: str,
+        factory: Callable[[Optional[int], int], object],
+        extension: Optional[str] = None
+) -> None:
+    """ Registers a compression algorithm for `compression_ratio`.
+
+    Args:
+        name (str): Name of the algorithm.
+        factory (Callable): Called as `factory(level, threads)`; returns an object with `compress(bytes) -> bytes`
+            and `flush() -> bytes` methods, like `zlib.compressobj`. `level` is None for the codec's default.
+        extension (str, optional): File extension used when writing compressed files. Defaults to `name`.
+    """
+    COMPRESSORS[name] = (factory, extension or name)
 
 
 def compression_ratio(
-        data: List[str],
+        data: Iterable[str],
         algorithm: str = 'gzip',
         verbose: bool = False,
-        path: Optional[str] = None
+        path: Optional[str] = None,
+        chunk_size: int = 1 << 20,
+        level: Optional[int] = None,
+        threads: int = 0
 ) -> float:
     """ Calculates the compression ratio for a collection of text.
+        The texts are joined by spaces and fed to a streaming compressor in chunks, so sizes are
+        measured in memory without ever building the joined corpus or writing to disk.
      Args:
-         path (str): Path to store temporarily zipped files.
-         data (List[str]): Strings to compress.
-         algorithm (str, optional): Either 'gzip' or 'xz'. Defaults to 'gzip'.
+         data (Iterable[str]): Strings to compress.
+         algorithm (str, optional): One of 'gzip', 'xz', 'bz2', 'zstd', 'lz4', 'brotli' (the last three need
+            the `zstandard`, `lz4` and `brotli` packages) or a name added with `register_compressor`. Defaults to 'gzip'.
          verbose (bool, optional): Print out the original and compressed size separately. Defaults to False.
+         path (str, optional): If given, also write the original and compressed files to this directory. Defaults to None.
+         chunk_size (int, optional): Approximate number of bytes fed to the compressor at a time. Defaults to 1MB.
+         level (int, optional): Compression level (preset for xz, quality for brotli). Defaults to the codec's default.
+         threads (int, optional): Compression threads, for codecs that support it (zstd; -1 for all cores). Defaults to 0.
      Returns:
          float: Compression ratio (original size / compressed size)
      """
-     
-    temp_dir = None
-    if not path:
-        temp_dir = tempfile.TemporaryDirectory()
-        path = Path(temp_dir.name)
-    else:
-        path = Path(path)
+    return compression_ratios(
+        data, algorithms=[algorithm], verbose=verbose, path=path, chunk_size=chunk_size,
+        levels={algorithm: level}, threads=threads
+    )[algorithm]
+
 
-    with (path / 'original.txt').open('w+') as f:
-        f.write(' '.join(data))
+def compression_ratios(
+        data: Iterable[str],
+        algorithms: Iterable[str] = ('gzip', 'xz'),
+        verbose: bool = False,
+        path: Optional[str] = None,
+        chunk_size: int = 1 << 20,
+        levels: Optional[Dict[str, Optional[int]]] = None,
+        threads: int = 0
+) -> Dict[str, float]:
+    """ Calculates the compression ratio with several algorithms in a single pass over the data.
+     Args:
+         data (Iterable[str]): Strings to compress.
+         algorithms (Iterable[str], optional): Algorithms to use (see `compression_ratio`). Defaults to ('gzip', 'xz').
+         verbose (bool, optional): Print out the original and compressed sizes. Defaults to False.
+         path (str, optional): If given, also write the original and compressed files to this directory. Defaults to None.
+         chunk_size (int, optional): Approximate number of bytes fed to the compressors at a time. Defaults to 1MB.
+         levels (Dict[str, int], optional): Compression level per algorithm. Defaults to each codec's default.
+         threads (int, optional): Compression threads, for codecs that support it. Defaults to 0.
+     Returns:
+         Dict[str, float]: Compression ratio (original size / compressed size) per algorithm.
+     """
+    algorithms = list(algorithms)
+    unknown = [a for a in algorithms if a not in COMPRESSORS]
+    if unknown:
+        raise ValueError(f"Compression algorithm must be one of {', '.join(f'`{a}`' for a in COMPRESSORS)}.")
 
-    original_size = os.path.getsize(os.path.join(path, "original.txt"))
+    levels = levels or {}
+    compressors = {a: COMPRESSORS[a][0](levels.get(a), threads) for a in algorithms}
 
-    if algorithm == 'gzip':
+    original_size, compressed_sizes = _compressed_sizes(_chunks(data, chunk_size), compressors, path=path)
 
-        with gzip.GzipFile(str(path / 'compressed.gz'), 'w+') as f:
-            f.write(gzip.compress(' '.join(data).encode('utf-8')))
+    if verbose:
+        print(f"Original Size: {original_size}")
+        for algorithm, compressed_size in compressed_sizes.items():
+            print(f"Compressed Size ({algorithm}): {compressed_size}")
 
-        compressed_size = os.path.getsize(os.path.join(path, "compressed.gz"))
+    return {a: round(original_size / size, 3) for a, size in compressed_sizes.items()}
 
-    elif algorithm == 'xz': 
 
-        with xz.open(str(path / 'compressed.gz'), 'wb') as f:
-            f.write(' '.join(data).encode('utf-8'))
+def document_compression_ratios(
+        data: Iterable[str],
+        algorithm: str = 'gzip',
+        level: Optional[int] = None,
+        prime: Optional[str] = None
+) -> List[float]:
+    """ Calculates the compression ratio of each document on its own.
+     Args:
+         data (Iterable[str]): Strings to compress.
+         algorithm (str, optional): Compression algorithm (see `compression_ratio`). Defaults to 'gzip'.
+         level (int, optional): Compression level. Defaults to the codec's default.
+         prime (str, optional): Text the compressor has already seen before each document (e.g. a reference
+            corpus), so that ratios measure how much is new relative to it. Only for algorithms whose
+            compressor can be copied (gzip). Defaults to None.
+     Returns:
+         List[float]: Compression ratio of each document.
+     """
+    return windowed_compression_ratios(data, window=1, algorithm=algorithm, level=level, prime=prime)
+
+
+def windowed_compression_ratios(
+        data: Iterable[str],
+        window: int = 1000,
+        stride: Optional[int] = None,
+        algorithm: str = 'gzip',
+        level: Optional[int] = None,
+        prime: Optional[str] = None
+) -> List[float]:
+    """ Calculates the compression ratio of windows of consecutive documents in a single pass,
+        e.g. to find low-diversity regions of a generation stream.
+        Windows start every `stride` documents (documents between windows are skipped when `stride > window`);
+        the last ones are truncated at the end of the data.
+        Each window compresses a copy of one prepared compressor state (for algorithms that
+        support it) instead of setting up a new compressor.
+     Args:
+         data (Iterable[str]): Strings to compress.
+         window (int, optional): Number of documents per window. Defaults to 1000.
+         stride (int, optional): Number of documents between window starts. Defaults to `window` (no overlap).
+         algorithm (str, optional): Compression algorithm (see `compression_ratio`). Defaults to 'gzip'.
+         level (int, optional): Compression level. Defaults to the codec's default.
+         prime (str, optional): Text the compressor has already seen before each window (see
+            `document_compression_ratios`). Defaults to None.
+     Returns:
+         List[float]: Compression ratio of each window, in order of window start.
+     """
+    if algorithm not in COMPRESSORS:
+        raise ValueError(f"Compression algorithm must be one of {', '.join(f'`{a}`' for a in COMPRESSORS)}.")
+    stride = stride or window
+    if window < 1 or stride < 1:
+        raise ValueError("Window and stride must be at least 1.")
+
+    factory = COMPRESSORS[algorithm][0]
+    base = factory(level, 0)
+    if prime is not None:
+        if not hasattr(base, 'copy'):
+            raise ValueError(f"Priming needs a compressor that supports copy(), which `{algorithm}` does not.")
+        base.compress(prime.encode('utf-8'))
+        base.flush(zlib.Z_SYNC_FLUSH)
+    new_compressor = base.copy if hasattr(base, 'copy') else lambda: factory(level, 0)
+
+    ratios = []
+    active = deque()
+    for i, doc in enumerate(data):
+        if i % stride == 0:
+            active.append(_Window(new_compressor()))
+        encoded = doc.encode('utf-8')
+        for w in active:
+            w.add(encoded)
+        if active and active[0].num_docs == window:
+            ratios.append(active.popleft().ratio())
+
+    ratios.extend(w.ratio() for w in active)
+    return ratios
+
+
+class _Window:
+    """ Running sizes of `' '.join(docs)` for the documents of one window. """
+
+    def __init__(self, compressor):
+        self.compressor = compressor
+        self.num_docs = 0
+        self.original_size = 0
+        self.compressed_size = 0
+
+    def add(self, encoded: bytes) -> None:
+        if self.num_docs:
+            encoded = b' ' + encoded
+        self.num_docs += 1
+        self.original_size += len(encoded)
+        self.compressed_size += len(self.compressor.compress(encoded))
+
+    def ratio(self) -> float:
+        self.compressed_size += len(self.compressor.flush())
+        return round(self.original_size / self.compressed_size, 3)
+
+
+def _chunks(
+        data: Iterable[str],
+        chunk_size: int
+) -> Iterator[bytes]:
+    """ Yields the UTF-8 encoding of `' '.join(data)` in chunks of roughly `chunk_size` bytes. """
+    buffer: List[bytes] = []
+    buffered = 0
+    for i, doc in enumerate(data):
+        encoded = (doc if i == 0 else ' ' + doc).encode('utf-8')
+        buffer.append(encoded)
+        buffered += len(encoded)
+        if buffered >= chunk_size:
+            yield b''.join(buffer)
+            buffer, buffered = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def _compressed_sizes(
+        chunks: Iterable[bytes],
+        compressors: Dict[str, object],
+        path: Optional[str] = None
+) -> Tuple[int, Dict[str, int]]:
+    """ Returns the original size and the compressed size per compressor (in bytes) of the concatenated chunks. """
+    original_size = 0
+    compressed_sizes = {a: 0 for a in compressors}
 
-        compressed_size = (path / "compressed.gz").stat().st_size
+    files = {}
+    if path:
+        files[None] = (Path(path) / 'original.txt').open('wb')
+        for a in compressors:
+            files[a] = (Path(path) / f'compressed.{COMPRESSORS[a][1]}').open('wb')
 
-    if verbose: 
-        print(f"Original Size: {original_size}\nCompressed Size: {compressed_size}")
+    try:
+        for chunk in chunks:
+            original_size += len(chunk)
+            if path:
+                files[None].write(chunk)
+            for a, compressor in compressors.items():
+                compressed = compressor.compress(chunk)
+                compressed_sizes[a] += len(compressed)
+                if path:
+                    files[a].write(compressed)
 
-    if temp_dir:
-        temp_dir.cleanup()
+        for a, compressor in compressors.items():
+            compressed = compressor.flush()
+            compressed_sizes[a] += len(compressed)
+            if path:
+                files[a].write(compressed)
+    finally:
+        for f in files.values():
+            f.close()
 
-    return round(original_size / compressed_size, 3)
-    
+    return original_size, compressed_sizes
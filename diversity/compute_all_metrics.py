@@ -3,132 +3,291 @@ Comprehensive diversity metrics computation function.
 This module computes all lexical diversity metrics plus embedding metrics for a given corpus of text.
 """
 
-from typing import List, Optional, Dict, Any
+from collections.abc import Mapping
+from typing import List, Optional, Dict, Any, Iterable, Iterator, Tuple, Union
 import logging
-from .compression import compression_ratio
+import time
+from .corpus import Corpus, as_corpus
+from .compression import compression_ratios
 from .homogenization import homogenization_score
 from .ngram_diversity import ngram_diversity_score
 from .self_repetition import self_repetition_score
-from .embedding import remote_clique, chamfer_dist
+from .embedding import remote_clique, chamfer_dist, get_embeddings, EmbeddingCache
 from .template import template_rate, templates_per_token
 from .functions import extract_patterns
+from .utils.dag import Node, run_graph
+
+
+# Nodes of the metric graph. Each takes the corpus (and the results of its dependencies) and
+# returns a dict of result entries, except the shared intermediates (embeddings, patterns).
+
+def _compression(corpus: Corpus, algorithms: List[str]) -> Dict[str, Any]:
+    return {f"compression_ratio_{algorithm}": ratio
+            for algorithm, ratio in compression_ratios(corpus, algorithms=algorithms).items()}
+
+
+def _homogenization(corpus: Corpus, measure: str, verbose: bool, batch_size: int) -> Dict[str, Any]:
+    return {f"homogenization_score_{measure}": homogenization_score(
+        corpus, measure=measure, verbose=verbose, batch_size=batch_size)}
+
+
+def _ngram_diversity(corpus: Corpus, n: int) -> Dict[str, Any]:
+    return {"ngram_diversity": ngram_diversity_score(corpus, num_n=n)}
+
+
+def _self_repetition(corpus: Corpus, n: int, verbose: bool) -> Dict[str, Any]:
+    return {"self_repetition_score": self_repetition_score(corpus, n=n, verbose=verbose)}
+
+
+def _embeddings(corpus: Corpus, model: str, verbose: bool, batch_size: int, cache: Optional[EmbeddingCache]):
+    return get_embeddings(corpus, model=model, verbose=verbose, batch_size=batch_size, cache=cache)
+
+
+def _remote_clique(corpus: Corpus, embeddings, model: str) -> Dict[str, Any]:
+    # embeddings may have been computed in another process
+    corpus.memo(('embeddings', model), lambda: embeddings)
+    return {"remote_clique_score": remote_clique(corpus, model=model, verbose=False)}
+
+
+def _chamfer_dist(corpus: Corpus, embeddings, model: str) -> Dict[str, Any]:
+    corpus.memo(('embeddings', model), lambda: embeddings)
+    return {"chamfer_distance": chamfer_dist(corpus, model=model, verbose=False)}
+
+
+def _patterns(corpus: Corpus):
+    return extract_patterns(corpus)
+
+
+def _template_rate(corpus: Corpus, patterns, shard_size: int) -> Dict[str, Any]:
+    return {"template_rate": template_rate(corpus, templates=patterns, shard_size=shard_size)}
+
+
+def _templates_per_token(corpus: Corpus, patterns, shard_size: int) -> Dict[str, Any]:
+    tpt_scores = templates_per_token(corpus, templates=patterns, shard_size=shard_size)
+    return {
+        "avg_templates_per_token": sum(tpt_scores) / len(tpt_scores) if tpt_scores else 0.0,
+        "templates_per_token_scores": tpt_scores,
+    }
+
+
+# result entries of each metric node with a fixed name, in output order
+_OUTPUTS = {
+    "ngram_diversity": ("ngram_diversity",),
+    "self_repetition": ("self_repetition_score",),
+    "remote_clique": ("remote_clique_score",),
+    "chamfer_dist": ("chamfer_distance",),
+    "template_rate": ("template_rate",),
+    "templates_per_token": ("avg_templates_per_token", "templates_per_token_scores"),
+}
+
+_MESSAGES = {
+    "compression": "Computing compression ratio...",
+    "homogenization": "Computing homogenization score using {homogenization_measure}...",
+    "ngram_diversity": "Computing n-gram diversity (n={ngram_n})...",
+    "self_repetition": "Computing self-repetition score (n={self_repetition_n})...",
+    "embeddings": "Computing embedding-based metrics using {embedding_model}...",
+    "patterns": "Extracting patterns for template metrics...",
+    "template_rate": "Computing template rate...",
+    "templates_per_token": "Computing templates per token...",
+}
+
+
+class MetricResults(Mapping):
+    """
+    Read-only mapping of metric names to values, computed on first access and then kept.
+    Accessing a metric only runs the steps it depends on (e.g. `compression_ratio_gzip` never
+    embeds the corpus); `compute()` runs every remaining step, concurrently if `n_jobs` > 1.
+
+    Besides the metrics, "timings" holds the running time in seconds of the steps run so far, and
+    "formatted_table" (with a markdown or LaTeX `output_format`) the table of all metrics.
+    """
+
+    def __init__(
+            self,
+            corpus: Corpus,
+            nodes: Dict[str, Node],
+            outputs: Dict[str, Tuple[str, ...]],
+            n_jobs: int = 1,
+            output_format: str = "dict",
+            verbose: bool = True,
+            settings: Optional[Dict[str, Any]] = None
+    ):
+        self._corpus = corpus
+        self._nodes = nodes
+        self._outputs = outputs
+        self._node_of = {key: name for name, keys in outputs.items() for key in keys}
+        self._n_jobs = n_jobs
+        self._output_format = output_format.lower()
+        self._verbose = verbose
+        self._settings = settings or {}
+        self._done: Dict[str, Any] = {}
+        self._timings: Dict[str, float] = {}
+        self._warned = set()
+
+    def _on_start(self, name: str) -> None:
+        if self._verbose and name in _MESSAGES:
+            print(_MESSAGES[name].format(**self._settings))
+
+    def _on_error(self, name: str, e: Exception) -> None:
+        group = "embedding" if name in ("embeddings", "remote_clique", "chamfer_dist") else "template"
+        if self._verbose and group not in self._warned:
+            self._warned.add(group)
+            warning = "⚠️  Warning: Could not compute" if group == "embedding" else "Warning: Could not compute"
+            print(f"{warning} {group} metrics - {e}")
+
+    def _run(self, targets: Iterable[str], n_jobs: int) -> None:
+        targets = [name for name in targets if name not in self._done]
+        if not targets:
+            return
+        start = time.perf_counter()
+        done, timings = run_graph(self._nodes, self._corpus, n_jobs=n_jobs, on_start=self._on_start,
+                                  on_error=self._on_error, targets=targets, done=self._done)
+        self._done.update(done)
+        self._timings.update(timings)
+        self._timings["total"] = self._timings.get("total", 0.0) + time.perf_counter() - start
+
+    def _keys(self) -> List[str]:
+        keys = [key for keys in self._outputs.values() for key in keys] + ["timings"]
+        if self._output_format in ("markdown", "latex"):
+            keys.append("formatted_table")
+        return keys
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "timings":
+            return dict(self._timings)
+        if key == "formatted_table" and key in self._keys():
+            results = self.compute()
+            return _format_markdown_table(results) if self._output_format == "markdown" else _format_latex_table(results)
+        if key not in self._node_of:
+            raise KeyError(key)
+        name = self._node_of[key]
+        # a single metric runs in this process; workers would have to rebuild the corpus caches
+        self._run([name], n_jobs=1)
+        return self._done[name][key] if self._done[name] is not None else None
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys())
+
+    def __len__(self) -> int:
+        return len(self._keys())
+
+    def computed(self) -> List[str]:
+        """ Names of the metrics computed so far (without computing the others). """
+        return [key for key, name in self._node_of.items() if name in self._done]
+
+    def compute(self) -> Dict[str, Any]:
+        """ Computes every remaining metric and returns all of them (with "timings") as a dict. """
+        self._run(self._outputs, n_jobs=self._n_jobs)
+        return {key: self[key] for key in self._keys() if key != "formatted_table"}
 
 
 def compute_all_metrics(
-    corpus: List[str],
+    corpus: Union[List[str], Corpus],
     output_format: str = "dict",
     embedding_model: Optional[str] = "Qwen/Qwen3-Embedding-0.6B",
     homogenization_measure: str = "rougel",
-    compression_algorithm: str = "gzip",
+    compression_algorithm: Union[str, List[str]] = "gzip",
     ngram_n: int = 4,
     self_repetition_n: int = 4,
     template_shard_size: int = 500,
     verbose: bool = True,
-    batch_size: int = 64
-) -> Dict[str, Any]:
+    batch_size: int = 64,
+    embedding_cache: Optional[EmbeddingCache] = None,
+    n_jobs: int = 1,
+    metrics: Optional[Iterable[str]] = None,
+    lazy: bool = False
+) -> Union[Dict[str, Any], MetricResults]:
     """
     Computes all available diversity metrics for a corpus of text.
+
+    The metrics and their shared intermediates (embeddings, part-of-speech patterns) form a
+    dependency graph; with `n_jobs` > 1, independent metrics run concurrently in worker processes,
+    so a full report takes about as long as its slowest chain of metrics.
     
     Args:
-        corpus (List[str]): List of text documents to analyze
+        corpus (List[str] | Corpus): List of text documents to analyze. Tokens, n-grams and
+            part-of-speech tags are computed once and shared by all metrics.
         output_format (str): Format for output - "dict", "markdown", or "latex"
         embedding_model (str): Model to use for embedding-based metrics
         homogenization_measure (str): Measure for homogenization score ("rougel", "bertscore", "bleu")
-        compression_algorithm (str): Algorithm for compression ratio ("gzip", "xz")
+        compression_algorithm (str | List[str]): Algorithm(s) for compression ratio ("gzip", "xz", "bz2", "zstd", "lz4",
+            "brotli"). A single name is computed alongside "gzip"; a list is computed as given, in one pass over the corpus.
         ngram_n (int): Maximum n-gram size for n-gram diversity
         self_repetition_n (int): N-gram size for self-repetition score
         template_shard_size (int): Shard size for template processing
         verbose (bool): Whether to show progress messages
         batch_size (int): Batch size for embedding computations
+        embedding_cache (EmbeddingCache, optional): Cache for document embeddings (e.g. with an on-disk store).
+            The corpus is embedded once and shared by the embedding-based metrics either way.
+        n_jobs (int): Worker processes running independent metrics concurrently. With 1, metrics run
+            one after the other in this process. Defaults to 1.
+        metrics (Iterable[str], optional): Metrics to compute, by result name (e.g. "compression_ratio_gzip",
+            "remote_clique_score") or group ("compression", "homogenization", "ngram_diversity",
+            "self_repetition", "remote_clique", "chamfer_dist", "template_rate", "templates_per_token").
+            Defaults to all of them.
+        lazy (bool): Return a `MetricResults` mapping that computes each metric on first access instead
+            of computing everything up front. Defaults to False.
     
     Returns:
-        Dict[str, Any]: Dictionary containing all computed metrics and formatted table if requested
+        Dict[str, Any] | MetricResults: Dictionary containing all computed metrics, the running time of each step
+            in seconds (under "timings"), and formatted table if requested
     """
     
+    # build the shared tokenization/n-gram/POS cache once for every metric
+    corpus = as_corpus(corpus)
+
+    if isinstance(compression_algorithm, str):
+        compression_algorithm = list(dict.fromkeys(["gzip", compression_algorithm]))
+    outputs = {
+        "compression": tuple(f"compression_ratio_{algorithm}" for algorithm in compression_algorithm),
+        "homogenization": (f"homogenization_score_{homogenization_measure}",),
+        **_OUTPUTS,
+    }
+    if metrics is not None:
+        metrics = set(metrics)
+        available = {key for keys in outputs.values() for key in keys} | set(outputs)
+        unknown = metrics - available
+        if unknown:
+            raise ValueError(f"Unknown metrics: {', '.join(sorted(unknown))}. "
+                             f"Choose from: {', '.join(sorted(available))}.")
+        outputs = {name: keys for name, keys in outputs.items()
+                   if name in metrics or any(key in metrics for key in keys)}
+
     if verbose:
         print("Computing diversity metrics for corpus...")
         print(f"Corpus size: {len(corpus)} documents")
-    
-    results = {}
-    
-    # Compression-based metrics
-    if verbose:
-        print("Computing compression ratio...")
-    results["compression_ratio_gzip"] = compression_ratio(
-        corpus, algorithm="gzip", verbose=False
-    )
-    
-    if compression_algorithm == "xz":
-        results["compression_ratio_xz"] = compression_ratio(
-            corpus, algorithm="xz", verbose=False
-        )
-    
-    # Homogenization score
-    if verbose:
-        print(f"Computing homogenization score using {homogenization_measure}...")
-    results[f"homogenization_score_{homogenization_measure}"] = homogenization_score(
-        corpus, measure=homogenization_measure, verbose=verbose, batch_size=batch_size
-    )
-    
-    # N-gram diversity
-    if verbose:
-        print(f"Computing n-gram diversity (n={ngram_n})...")
-    results["ngram_diversity"] = ngram_diversity_score(corpus, num_n=ngram_n)
-    
-    # Self-repetition score
-    if verbose:
-        print(f"Computing self-repetition score (n={self_repetition_n})...")
-    results["self_repetition_score"] = self_repetition_score(
-        corpus, n=self_repetition_n, verbose=verbose
-    )
-    
-    # Embedding-based metrics
-    if verbose:
-        print(f"Computing embedding-based metrics using {embedding_model}...")
-    
-    try:
-        results["remote_clique_score"] = remote_clique(
-            corpus, model=embedding_model, verbose=verbose, batch_size=batch_size
-        )
-        results["chamfer_distance"] = chamfer_dist(
-            corpus, model=embedding_model, verbose=verbose, batch_size=batch_size
-        )
-    except Exception as e:
-        if verbose:
-            print(f"⚠️  Warning: Could not compute embedding metrics - {e}")
-        results["remote_clique_score"] = None
-        results["chamfer_distance"] = None
-    
-    # Template-based metrics
-    if verbose:
-        print("Extracting patterns for template metrics...")
-    
-    try:
-        patterns = extract_patterns(corpus)
-        
-        if verbose:
-            print("Computing template rate...")
-        results["template_rate"] = template_rate(
-            corpus, templates=patterns, shard_size=template_shard_size
-        )
-        
-        if verbose:
-            print("Computing templates per token...")
-        tpt_scores = templates_per_token(
-            corpus, templates=patterns, shard_size=template_shard_size
-        )
-        results["avg_templates_per_token"] = sum(tpt_scores) / len(tpt_scores) if tpt_scores else 0.0
-        results["templates_per_token_scores"] = tpt_scores
-        
-    except Exception as e:
-        if verbose:
-            print(f"Warning: Could not compute template metrics - {e}")
-        results["template_rate"] = None
-        results["avg_templates_per_token"] = None
-        results["templates_per_token_scores"] = None
-    
+
+    # progress bars of concurrent metrics would interleave
+    progress = verbose and n_jobs <= 1
+
+    nodes = {
+        "compression": Node(_compression, kwargs=dict(algorithms=compression_algorithm)),
+        "homogenization": Node(_homogenization, kwargs=dict(
+            measure=homogenization_measure, verbose=progress, batch_size=batch_size)),
+        "ngram_diversity": Node(_ngram_diversity, kwargs=dict(n=ngram_n)),
+        "self_repetition": Node(_self_repetition, kwargs=dict(n=self_repetition_n, verbose=progress)),
+        "embeddings": Node(_embeddings, kwargs=dict(
+            model=embedding_model, verbose=progress, batch_size=batch_size, cache=embedding_cache), optional=True),
+        "remote_clique": Node(_remote_clique, ("embeddings",), dict(model=embedding_model), optional=True),
+        "chamfer_dist": Node(_chamfer_dist, ("embeddings",), dict(model=embedding_model), optional=True),
+        "patterns": Node(_patterns, optional=True),
+        "template_rate": Node(_template_rate, ("patterns",), dict(shard_size=template_shard_size), optional=True),
+        "templates_per_token": Node(_templates_per_token, ("patterns",), dict(shard_size=template_shard_size),
+                                    optional=True),
+    }
+
+    settings = dict(homogenization_measure=homogenization_measure, ngram_n=ngram_n,
+                    self_repetition_n=self_repetition_n, embedding_model=embedding_model)
+    results = MetricResults(corpus, nodes, outputs, n_jobs=n_jobs, output_format=output_format,
+                            verbose=verbose, settings=settings)
+    if lazy:
+        return results
+
+    results = results.compute()
     if verbose:
         print("All metrics computed successfully!")
+        for name, seconds in results["timings"].items():
+            print(f"  {name}: {seconds:.2f}s")
     
     # Format output based on requested format
     if output_format.lower() == "markdown":
@@ -147,7 +306,7 @@ def _format_markdown_table(results: Dict[str, Any]) -> str:
     table += "|--------|-------|\n"
     
     for metric, value in results.items():
-        if metric in ["formatted_table", "templates_per_token_scores"]:
+        if metric in ["formatted_table", "templates_per_token_scores", "timings"]:
             continue
         
         if value is None:
@@ -174,7 +333,7 @@ def _format_latex_table(results: Dict[str, Any]) -> str:
     table += "\\hline\n"
     
     for metric, value in results.items():
-        if metric in ["formatted_table", "templates_per_token_scores"]:
+        if metric in ["formatted_table", "templates_per_token_scores", "timings"]:
             continue
             
         if value is None:
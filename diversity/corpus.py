@@ -0,0 +1,175 @@
+"""
+Shared, lazily computed views of a corpus so that several metrics can reuse
+the same tokenization, n-gram tables and part-of-speech tags.
+"""
+
+import itertools
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+from nltk.tokenize import sent_tokenize
+
+from .patterns import get_pos
+from .utils.ngrams import doc_ngram_codes, encode_documents, encode_tokens, next_ngram_codes
+
+
+class Corpus(Sequence):
+    """
+    A list of documents together with a cache of intermediate representations.
+
+    Every metric in this package accepts a `Corpus` wherever it accepts a `List[str]`.
+    Building one up front and passing it to several metrics means the corpus is only
+    split, n-grammed and tagged once.
+
+    Example Usage:
+    >>> corpus = Corpus(["The quick brown fox.", "The slow red fox."])
+    >>> ngram_diversity_score(corpus), self_repetition_score(corpus)
+    """
+
+    def __init__(
+            self,
+            documents: Iterable[str],
+            pos_options: Optional[Dict[str, Any]] = None,
+            n_jobs: int = 1
+    ):
+        """
+        Args:
+            documents (Iterable[str]): The documents.
+            pos_options (Dict[str, Any], optional): Keyword arguments of `get_pos` used to tag the corpus
+                sentences, e.g. `{'cache': PosCache('tags.sqlite'), 'n_process': 8}`. Defaults to None.
+            n_jobs (int, optional): Processes splitting the documents into sentences. Defaults to 1.
+        """
+        self.documents = list(documents)
+        self.pos_options = dict(pos_options or {})
+        self.n_jobs = n_jobs
+        self._cache = {}
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def __getitem__(self, index):
+        return self.documents[index]
+
+    def __iter__(self):
+        return iter(self.documents)
+
+    def __repr__(self) -> str:
+        return f"Corpus({len(self)} documents, cached={sorted(map(str, self._cache))})"
+
+    def memo(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """ Returns the cached value for `key`, computing it with `fn` on first use. """
+        if key not in self._cache:
+            self._cache[key] = fn()
+        return self._cache[key]
+
+    def clear(self) -> None:
+        """ Drops every cached representation. """
+        self._cache.clear()
+
+    @property
+    def word_ids(self) -> np.ndarray:
+        """
+        The whole corpus as one sequence of space-separated words (so n-grams may cross
+        documents, as in `' '.join(documents).split(' ')`), encoded as int32 vocabulary ids.
+        """
+        return self.memo('word_ids', lambda: encode_tokens(
+            itertools.chain.from_iterable(doc.split(' ') for doc in self.documents)))
+
+    @property
+    def doc_token_ids(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Whitespace tokens of every document, concatenated and encoded as int32 vocabulary ids,
+        and the offsets of each document in that array (document i is ids[offsets[i]:offsets[i + 1]]).
+        """
+        return self.memo('doc_token_ids', lambda: encode_documents(doc.split() for doc in self.documents))
+
+    @property
+    def doc_lengths(self) -> np.ndarray:
+        """ Number of whitespace tokens in each document. """
+        return np.diff(self.doc_token_ids[1])
+
+    @property
+    def sentences(self) -> List[str]:
+        """ Sentences of the corpus, document by document (sentences never cross documents). """
+        return self._sentence_table[0]
+
+    @property
+    def sentence_offsets(self) -> np.ndarray:
+        """ Offsets of each document's sentences: document i has sentences[offsets[i]:offsets[i + 1]]. """
+        return self._sentence_table[1]
+
+    @property
+    def sentence_doc_ids(self) -> np.ndarray:
+        """ Index of the document each sentence belongs to. """
+        return self.memo('sentence_doc_ids', lambda: np.repeat(np.arange(len(self)), np.diff(self.sentence_offsets)))
+
+    @property
+    def _sentence_table(self) -> Tuple[List[str], np.ndarray]:
+        return self.memo('sentences', lambda: split_sentences(self.documents, n_jobs=self.n_jobs))
+
+    @property
+    def pos(self) -> Tuple[List[str], List[List[Tuple[str, str]]]]:
+        """ Output of `get_pos` on the corpus sentences: joined tags and (token, tag) tuples. """
+        return self.memo('pos', lambda: get_pos(self.sentences, **self.pos_options))
+
+    def ngram_codes(self, n: int) -> np.ndarray:
+        """ Dense integer codes of all n-grams over `word_ids` (equal codes for equal n-grams). """
+        if n == 1:
+            return self.word_ids
+        return self.memo(('ngram_codes', n),
+                         lambda: next_ngram_codes(self.ngram_codes(n - 1), self.word_ids, n))
+
+    def doc_ngram_codes(self, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Dense integer codes of the n-grams within each document (n-grams never cross documents)
+        over `doc_token_ids`, and the index of the document each n-gram belongs to.
+        """
+        return self.memo(('doc_ngram_codes', n), lambda: doc_ngram_codes(*self.doc_token_ids, n))
+
+
+def _split_chunk(documents: List[str]) -> List[List[str]]:
+    return [sent_tokenize(doc) for doc in documents]
+
+
+def split_sentences(
+        documents: List[str],
+        n_jobs: int = 1,
+        chunk_size: int = 1000
+) -> Tuple[List[str], np.ndarray]:
+    """ Splits each document into sentences, so that sentences never cross documents.
+
+    Args:
+        documents (List[str]): Documents to split.
+        n_jobs (int, optional): Processes splitting chunks of documents in parallel. Defaults to 1.
+        chunk_size (int, optional): Documents per task. Defaults to 1000.
+
+    Returns:
+        Tuple[List[str], np.ndarray]: Sentences of all documents in order, and the offsets of each
+        document's sentences in that list (document i has sentences[offsets[i]:offsets[i + 1]]).
+    """
+    chunks = [documents[i:i + chunk_size] for i in range(0, len(documents), chunk_size)]
+    if n_jobs > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            split = list(executor.map(_split_chunk, chunks))
+    else:
+        split = map(_split_chunk, chunks)
+
+    sentences: List[str] = []
+    counts: List[int] = []
+    for chunk in split:
+        for doc_sentences in chunk:
+            sentences.extend(doc_sentences)
+            counts.append(len(doc_sentences))
+
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return sentences, offsets
+
+
+def as_corpus(data: Union[Corpus, Iterable[str]]) -> Corpus:
+    """ Wraps `data` in a `Corpus` unless it already is one. """
+    if isinstance(data, Corpus):
+        return data
+    return Corpus(data)
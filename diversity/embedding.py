@@ -6,55 +6,227 @@ Following Samuel Rhys Cox et al. 2021. "Directed Diversity: Leveraging Language
 '''
 
 from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_distances
 import numpy as np
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from tqdm import tqdm
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple, Union
+from .corpus import Corpus, as_corpus
+from .utils.cache import LRUCache
 
 
-def remote_clique(
+_MODELS: Dict[str, SentenceTransformer] = {}
+
+
+def get_model(model: str) -> SentenceTransformer:
+    """ Loads an embedding model once per process and returns the same instance afterwards. """
+    if model not in _MODELS:
+        _MODELS[model] = SentenceTransformer(model)
+    return _MODELS[model]
+
+
+class EmbeddingCache(LRUCache):
+    """
+    Embeddings keyed by a hash of the model name and the text, kept in memory (least recently
+    used entries are evicted past `max_entries`) and optionally on disk as one `.npy` file per
+    entry (least recently used files are evicted past `max_disk_bytes`).
+    """
+
+    def __init__(
+            self,
+            max_entries: int = 10000,
+            cache_dir: Optional[Union[str, os.PathLike]] = None,
+            max_disk_bytes: Optional[int] = None
+    ):
+        """
+        Args:
+            max_entries (int, optional): Embeddings kept in memory. Defaults to 10000.
+            cache_dir (str, optional): Directory for the on-disk store. Defaults to None (memory only).
+            max_disk_bytes (int, optional): Size limit of the on-disk store. Defaults to None (unbounded).
+        """
+        super().__init__(max_entries)
+        self.max_disk_bytes = max_disk_bytes
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self._disk_bytes = 0
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self._disk_bytes = sum(p.stat().st_size for p in self.cache_dir.glob('*.npy'))
+
+    def _load(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        if self.cache_dir:
+            for key in keys:
+                path = self.cache_dir / f"{key}.npy"
+                if path.exists():
+                    found[key] = np.load(path)
+                    os.utime(path)  # mark as recently used
+        return found
+
+    def _save(self, items: Dict[str, np.ndarray]) -> None:
+        if self.cache_dir:
+            for key, value in items.items():
+                path = self.cache_dir / f"{key}.npy"
+                if not path.exists():
+                    np.save(path, value)
+                    self._disk_bytes += path.stat().st_size
+            self._evict_disk()
+
+    def _evict_disk(self) -> None:
+        if self.max_disk_bytes is None or self._disk_bytes <= self.max_disk_bytes:
+            return
+        paths = sorted(self.cache_dir.glob('*.npy'), key=lambda p: p.stat().st_mtime)
+        for path in paths:
+            if self._disk_bytes <= self.max_disk_bytes:
+                break
+            self._disk_bytes -= path.stat().st_size
+            path.unlink()
+
+
+_DEFAULT_CACHE = EmbeddingCache()
+
+
+def get_embeddings(
+        data: Union[List[str], Corpus],
+        model: str = 'Qwen/Qwen3-Embedding-0.6B',
+        verbose: bool = True,
+        batch_size: int = 64,
+        cache: Optional[EmbeddingCache] = None
+) -> np.ndarray:
+    """
+    Embeds documents, encoding only the texts that are not cached yet.
+    Args:
+        data (List[str] | Corpus): Strings to embed. A `Corpus` also keeps the result for other metrics.
+        model(str, optional): Model to use for embedding. Defaults to 'Qwen/Qwen3-Embedding-0.6B'.
+        verbose(bool, optional): Whether to display progress bar. Defaults to True.
+        batch_size(int, optional): Batch size for embedding. Defaults to 64.
+        cache(EmbeddingCache, optional): Cache to read from and fill. Defaults to a process-wide in-memory cache.
+    Returns:
+        np.ndarray: One embedding per document.
+    """
+    corpus = as_corpus(data)
+    return corpus.memo(('embeddings', model),
+                       lambda: _embed(corpus.documents, model, verbose, batch_size, cache or _DEFAULT_CACHE))
+
+
+def _embed(
         data: List[str],
+        model: str,
+        verbose: bool,
+        batch_size: int,
+        cache: EmbeddingCache
+) -> np.ndarray:
+    keys = [cache.key(model, text) for text in data]
+    found = {key: cache.get(key) for key in set(keys)}
+    missing = [key for key, value in found.items() if value is None]
+
+    if missing:
+        texts = {key: text for key, text in zip(keys, data)}
+        encoded = get_model(model).encode([texts[key] for key in missing],
+                                          batch_size=batch_size, show_progress_bar=verbose)
+        for key, embedding in zip(missing, encoded):
+            found[key] = embedding
+            cache.put(key, embedding)
+
+    return np.stack([found[key] for key in keys]) if keys else np.zeros((0, 0), dtype=np.float32)
+
+
+def remote_clique(
+        data: Union[List[str], Corpus],
         model: Optional[str] = 'Qwen/Qwen3-Embedding-0.6B',
         verbose: Optional[bool] = True,
-        batch_size: Optional[int] = 64
+        batch_size: Optional[int] = 64,
+        cache: Optional[EmbeddingCache] = None,
+        block_size: int = 2048,
+        n_jobs: int = 1
 ) -> float:
     """
     Calculates the remote clique score for a set of documents (corpus-level).
     This is the average mean pairwise distance of a data instance to other instances.
     Args:
-        data (List[str]): Strings to score.
+        data (List[str] | Corpus): Strings to score.
         model(str, optional): Model to use for embedding. Defaults to 'Qwen/Qwen3-Embedding-0.6B'.
         verbose(bool, optional): Whether to display progress bar. Defaults to True.
         batch_size(int, optional): Batch size for embedding. Defaults to 64.
+        cache(EmbeddingCache, optional): Embedding cache. Defaults to a process-wide in-memory cache.
+        block_size(int, optional): Tile size of the blockwise distance computation. Defaults to 2048.
+        n_jobs(int, optional): Threads computing tiles in parallel. Defaults to 1.
     Returns:
         float: Remote clique score.
     """
-    model = SentenceTransformer(model)
-    embeddings = model.encode(data, batch_size=batch_size, show_progress_bar=verbose)
-    distances = cosine_distances(embeddings)
-    mean_distances = np.mean(distances, axis=1)
+    embeddings = get_embeddings(data, model=model, verbose=verbose, batch_size=batch_size, cache=cache)
+    mean_distances, _ = _distance_stats(embeddings, block_size=block_size, n_jobs=n_jobs)
     return np.mean(mean_distances).round(3)
 
 
 def chamfer_dist(
-        data: List[str],
+        data: Union[List[str], Corpus],
         model: Optional[str] = 'Qwen/Qwen3-Embedding-0.6B',
         verbose: Optional[bool] = True,
-        batch_size: Optional[int] = 64
+        batch_size: Optional[int] = 64,
+        cache: Optional[EmbeddingCache] = None,
+        block_size: int = 2048,
+        n_jobs: int = 1
 ) -> float:
     """
     Calculates the chamfer distance for a set of documents (corpus-level).
     This is the average minimum pairwise distance of a data instance to other instances.
     Args:
-        data (List[str]): Strings to score.
+        data (List[str] | Corpus): Strings to score.
         model(str, optional): Model to use for embedding. Defaults to 'Qwen/Qwen3-Embedding-0.6B'.
         verbose(bool, optional): Whether to display progress bar. Defaults to True.
         batch_size(int, optional): Batch size for embedding. Defaults to 64.
+        cache(EmbeddingCache, optional): Embedding cache. Defaults to a process-wide in-memory cache.
+        block_size(int, optional): Tile size of the blockwise distance computation. Defaults to 2048.
+        n_jobs(int, optional): Threads computing tiles in parallel. Defaults to 1.
     Returns:
         float: Chamfer distance.
     """
-    model = SentenceTransformer(model)
-    embeddings = model.encode(data, batch_size=batch_size, show_progress_bar=verbose)
-    distances = cosine_distances(embeddings)
-    min_distances = np.min(distances + np.eye(len(distances)) * 1e9, axis=1)
+    embeddings = get_embeddings(data, model=model, verbose=verbose, batch_size=batch_size, cache=cache)
+    _, min_distances = _distance_stats(embeddings, block_size=block_size, n_jobs=n_jobs)
     return np.mean(min_distances).round(3)
+
+
+def _distance_stats(
+        embeddings: np.ndarray,
+        block_size: int = 2048,
+        n_jobs: int = 1
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Computes, for each embedding, its mean cosine distance to all embeddings (itself included,
+    at distance 0) and its minimum cosine distance to the other embeddings, one
+    block_size x block_size tile of the distance matrix at a time (O(N·d + block_size²) memory).
+    As with `cosine_distances(x) + np.eye(N) * 1e9`, an embedding's distance to itself counts as
+    1e9 for the minimum, so a single embedding has a minimum distance of 1e9.
+    """
+    x = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    x = x / np.where(norms == 0, 1, norms)
+    n = len(x)
+
+    def row_block(start: int) -> Tuple[np.ndarray, np.ndarray]:
+        rows = x[start:start + block_size]
+        sums = np.zeros(len(rows), dtype=np.float64)
+        mins = np.full(len(rows), np.inf, dtype=np.float32)
+        for col in range(0, n, block_size):
+            tile = 1 - rows @ x[col:col + block_size].T
+            np.clip(tile, 0, 2, out=tile)
+            if col == start:
+                np.fill_diagonal(tile, 0)
+                sums += tile.sum(axis=1, dtype=np.float64)
+                np.fill_diagonal(tile, 1e9)
+            else:
+                sums += tile.sum(axis=1, dtype=np.float64)
+            np.minimum(mins, tile.min(axis=1), out=mins)
+        return sums / n, mins
+
+    starts = range(0, n, block_size)
+    if n_jobs > 1:
+        with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+            blocks = list(executor.map(row_block, starts))
+    else:
+        blocks = [row_block(start) for start in starts]
+
+    if not blocks:
+        return np.zeros(0), np.zeros(0)
+    return np.concatenate([b[0] for b in blocks]), np.concatenate([b[1] for b in blocks])
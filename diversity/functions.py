@@ -2,19 +2,21 @@
 
 import numpy as np
 import itertools
-from typing import List, Optional
+from typing import List, Optional, Union
 from tqdm import tqdm
-from .patterns import token_patterns, get_pos, pos_patterns
-from nltk.tokenize import sent_tokenize
+from .patterns import token_patterns, pos_patterns_many
+from .corpus import Corpus, as_corpus
+from .utils.aho_corasick import AhoCorasick
 
-def extract_patterns(text: List[str], 
+def extract_patterns(text: Union[List[str], Corpus], 
                      n: int = 5,
                      top_n: int = 100
 ) -> dict:
     """ Extracts text and part-of-speech patterns from text input. 
         Used to return a dictionary of patterns and the corresponding text match. 
     Args:
-        text (List[str]): List of strings to extract patterns from.
+        text (List[str] | Corpus): List of strings to extract patterns from. Passing a `Corpus`
+            reuses (and caches) its sentences, part-of-speech tags and extracted patterns.
         n (int, optional): N-gram size. Defaults to 5.
         top_n (int, optional): Number of top patterns to extract. Defaults to 100.
     Returns:
@@ -38,31 +40,37 @@ def extract_patterns(text: List[str],
     'NNS IN DT NN': {'walks on the hyper'},
     'IN DT NN NN': {'on the hyper dog.'}}
     """
+    corpus = as_corpus(text)
+    patterns = corpus.memo(('patterns', n, top_n), lambda: _extract_patterns(corpus, n, top_n))
+    # a copy, so that changing the result does not change what later calls on the corpus see
+    return {pattern: set(matches) for pattern, matches in patterns.items()}
 
-    # sentence tokenize then search for patterns in the entire list 
-    outputs = sent_tokenize(' '.join(text))
 
+def _extract_patterns(corpus: Corpus,
+                      n: int,
+                      top_n: int
+) -> dict:
+    # part-of-speech tags of the corpus sentences (cached on the corpus),
     # get the part-of-speech patterns (only include top_n patterns)
-    joined_pos, tuples  =  get_pos(outputs)
+    joined_pos, tuples  =  corpus.pos
     ngrams_pos  =  token_patterns(joined_pos, n, top_n)
 
-    # for the top n-gram patterns, cycle through and get the matching text
-    text_matches  = {}
-
-    for  pattern, _  in  ngrams_pos:
-        text_matches[pattern] =  pos_patterns(tuples, pattern)
-    
-    return text_matches
+    # get the matching text of every top n-gram pattern in one pass over the corpus
+    return pos_patterns_many(tuples, [pattern for pattern, _ in ngrams_pos])
 
 
 def match_patterns(text: str, 
-                   patterns: dict
+                   patterns: dict,
+                   matcher: Optional[AhoCorasick] = None
 ) -> List[tuple]:
     """ Matches text to part-of-speech patterns extracted from the `extract_patterns` function.
         Given set of patterns, used to identify which patterns appears in a single input text. 
     Args:
         text (str): Text to match patterns to.
         patterns (dict): Dictionary of patterns and their corresponding text.
+        matcher (AhoCorasick, optional): Automaton built from the pattern texts, e.g.
+            `AhoCorasick(s for v in patterns.values() for s in v)`, to reuse when matching many texts.
+            Defaults to building one.
     Returns:
         List[tuple]: List of tuples with the pattern and the text that matched.
 
@@ -80,11 +88,16 @@ def match_patterns(text: str,
     ('VBZ DT NN NN', 'scratches the calm fish.')]
     """
 
+    if matcher is None:
+        matcher = AhoCorasick(substr for text_match in patterns.values() for substr in text_match)
+    # every substring occurring in the text, found in one pass
+    found = matcher.matches(text)
+
     matches  =  []
 
     for pattern, text_match in patterns.items():
         for substr in text_match:
-            if substr in text:
+            if substr in found:
                 matches.append((pattern, substr))
 
     return matches
@@ -1,7 +1,10 @@
-from typing import List, Optional
+from statistics import NormalDist
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Union
+import numpy as np
 from tqdm import tqdm
-from rouge_score import rouge_scorer
-from evaluate import load
+from .embedding import EmbeddingCache
+from .pairwise_store import PairwiseScoreStore
+from .similarity import BertScore, Bleu, PairScorer, RougeL, concat_tokens, upper_triangle_scores
 
 def homogenization_score(
         data: List[str],
@@ -9,7 +12,10 @@ def homogenization_score(
         use_stemmer: Optional[str] = False,
         model: Optional[str] = "microsoft/deberta-base-mnli",
         verbose: Optional[bool] = True,
-        batch_size: Optional[int] = 64
+        batch_size: Optional[int] = 64,
+        n_jobs: int = 1,
+        cache: Optional[EmbeddingCache] = None,
+        store: Optional[PairwiseScoreStore] = None
 ) -> float:
     """ 
     Calculates the homogenization score for a set of documents (corpus-level). 
@@ -20,47 +26,386 @@ def homogenization_score(
          use_stemmer(str, optional): Whether to use stemming in the ROUGE-L calculation. Defaults to False.
          model(str, optional): Model to use for BERTScore. Defaults to 'microsoft/deberta-base-mnli'. 
          verbose(bool, optional): Whether to display progress bar. Defaults to True.
+         batch_size(int, optional): Batch size for encoding documents with BERTScore. Defaults to 64.
+         n_jobs(int, optional): Processes scoring ROUGE-L pairs in parallel. Defaults to 1.
+         cache(EmbeddingCache, optional): Cache of BERTScore token embeddings across calls. Defaults to None.
+         store(PairwiseScoreStore, optional): Store of ROUGE-L and BERTScore pair scores: stored pairs are
+            read instead of scored, and new pairs are added. Not supported for 'bleu', whose document
+            scores are not sums of pair scores. Defaults to None.
      Returns:
          float: Homogenization score.
      """
 
-    if measure == 'rougel':
-        scorer = rouge_scorer.RougeScorer(['rougeL'], use_stemmer=use_stemmer)
-    elif measure == 'bertscore': 
-        scorer = load("bertscore")
+    if measure in _SIMILARITIES:
+        similarity = _get_similarity(measure, use_stemmer, model, verbose, batch_size, cache)
+        n_jobs = n_jobs if measure == 'rougel' else 1
+        if store is not None:
+            return _finalize(_stored_symmetric_score(similarity, data, verbose, n_jobs, store), len(data))
+        return _finalize(_symmetric_score(similarity, data, verbose, n_jobs), len(data))
     elif measure == 'bleu':
-        scorer = load("bleu")
+        if store is not None:
+            raise ValueError("A pairwise score store cannot be used with `bleu`.")
+        bleu = Bleu()
+        corpus_score = 0
+        for doc_score in bleu.doc_scores(bleu.prepare(data)):
+            corpus_score += doc_score / (len(data) - 1)
     else: 
         raise ValueError("Scoring measure must be one of `rougel`, `bleu`, or `bertscore`.")
 
-    corpus_score = 0
-    
+    return _finalize(corpus_score, len(data))
+
+
+def _symmetric_score(
+        similarity,
+        data: List[str],
+        verbose: bool,
+        n_jobs: int
+) -> float:
+    """
+    Sums, over documents, the mean similarity to every other document, scoring each unordered
+    pair once. Each document's scores are added in document order, as in the all-pairs loop,
+    so the result is the same.
+    """
     if verbose:
         print('==> Scoring all pairs')
-     
-    for i, ref  in tqdm(enumerate(data), total=len(data), disable=(not verbose)):
-        # Get all the other utterances to compare against a specific utterance
-        preds = [x for j,x in enumerate(data) if j!=i]
-        refs = [ref for _ in range(len(preds))]
-        
-        # Get scores over whole batch and sum it up
-        if measure=='rougel':
-            doc_score = sum([scorer.score(pred, ref)['rougeL'].fmeasure for pred in preds])
-        elif measure=='bertscore':
-            doc_score = sum(scorer.compute(predictions=preds, 
-                                           references=refs, 
-                                           model_type=model, 
-                                           batch_size=batch_size)['f1'])
-        elif measure=='bleu':
-            # Need to double check that this is right
-            doc_score = scorer.compute(predictions=preds, 
-                                       references=[[r] for r in refs])['bleu']
-        # Then average
-        corpus_score += doc_score / (len(data) - 1)
-    
+
+    reps = similarity.prepare(data)
+    doc_scores = [0] * len(data)
+    corpus_score = 0
+    for i, scores in tqdm(upper_triangle_scores(similarity, reps, n_jobs=n_jobs),
+                          total=len(data), disable=(not verbose)):
+        # pairs (j, i) with j < i were added to doc_scores[i] by earlier rows
+        for j, score in enumerate(scores, start=i + 1):
+            doc_scores[i] += score
+            doc_scores[j] += score
+        corpus_score += doc_scores[i] / (len(data) - 1)
+    return corpus_score
+
+
+def _stored_symmetric_score(
+        similarity,
+        data: List[str],
+        verbose: bool,
+        n_jobs: int,
+        store: PairwiseScoreStore,
+        block_entries: int = 1 << 22
+) -> float:
+    """
+    Same as `_symmetric_score`, reading the pairs that are in `store` and scoring (and storing)
+    only the others, one block of rows at a time. Only documents with a missing pair are
+    tokenized or encoded.
+    """
+    n = len(data)
+    measure = similarity.store_key
+    hashes = [store.key(text) for text in data]
+    known = store.known_counts(measure, hashes)
+    needed = [i for i in range(n) if known.get(i, 0) < n - 1]
+    if verbose:
+        print(f'==> Scoring pairs of {len(needed)} documents ({n - len(needed)} fully stored)')
+
+    reps = [None] * n
+    for i, rep in zip(needed, similarity.prepare([data[i] for i in needed])):
+        reps[i] = rep
+
+    doc_scores = [0] * n
+    corpus_score = 0
+    block = max(1, block_entries // n)
+    with PairScorer(similarity, reps, n_jobs=n_jobs) as scorer:
+        for start in tqdm(range(0, n, block), disable=(not verbose)):
+            rows = range(start, min(start + block, n))
+            matrix = np.full((len(rows), n), np.nan)
+            for i, j, score in store.known_pairs(measure, hashes, rows):
+                matrix[i - start, j] = score
+
+            missing = [(i, (np.flatnonzero(np.isnan(matrix[i - start, i + 1:])) + i + 1).tolist()) for i in rows]
+            new_pairs = []
+            for i, cols, scores in scorer.score([(i, cols) for i, cols in missing if cols]):
+                matrix[i - start, cols] = scores
+                new_pairs.extend((hashes[i], hashes[j], score, None) for j, score in zip(cols, scores))
+            store.put_many(measure, new_pairs)
+
+            # same order of additions as in `_symmetric_score`
+            for i in rows:
+                for j, score in enumerate(matrix[i - start, i + 1:].tolist(), start=i + 1):
+                    doc_scores[i] += score
+                    doc_scores[j] += score
+                corpus_score += doc_scores[i] / (n - 1)
+    return corpus_score
+
+
+def _finalize(corpus_score: float, num_docs: int) -> float:
     # case where all strings are the exact same in the list
     if corpus_score == 0: 
-        corpus_score += len(data)
+        corpus_score += num_docs
     
     # returns corpus level homogenization score 
-    return round(corpus_score/len(data), 3)
+    return round(corpus_score/num_docs, 3)
+
+
+
+_SIMILARITIES = ('rougel', 'bertscore')
+
+
+def _get_similarity(measure, use_stemmer, model, verbose, batch_size, cache):
+    if measure == 'rougel':
+        return RougeL(use_stemmer=use_stemmer)
+    if measure == 'bertscore':
+        return BertScore(model, batch_size=batch_size, verbose=verbose, cache=cache)
+    raise ValueError(f"Scoring measure must be one of {', '.join(f'`{m}`' for m in _SIMILARITIES)}.")
+
+
+class HomogenizationPool:
+    """
+    A reference pool of documents with their representations (tokens, LCS bitmasks or token
+    embeddings, depending on the measure), computed once, to score new batches against it.
+
+    Example Usage:
+    >>> pool = HomogenizationPool(past_generations, measure='rougel')
+    >>> pool.score(new_batch)  # only new_batch x pool and new_batch x new_batch pairs are scored
+    >>> pool.add(new_batch)
+    """
+
+    def __init__(
+            self,
+            documents: Iterable[str] = (),
+            measure: str = 'rougel',
+            use_stemmer: Optional[bool] = False,
+            model: Optional[str] = "microsoft/deberta-base-mnli",
+            verbose: Optional[bool] = True,
+            batch_size: Optional[int] = 64,
+            cache: Optional[EmbeddingCache] = None
+    ):
+        """
+        Args:
+            documents (Iterable[str], optional): Initial documents of the pool. Defaults to none.
+            measure (str, optional): Either 'rougel', 'bertscore', or 'bleu'. Defaults to 'rougel'.
+            use_stemmer, model, verbose, batch_size, cache: As in `homogenization_score`.
+        """
+        if measure not in _SIMILARITIES + ('bleu',):
+            raise ValueError("Scoring measure must be one of `rougel`, `bleu`, or `bertscore`.")
+        self.measure = measure
+        self.verbose = verbose
+        if measure == 'bleu':
+            self._similarity = Bleu()
+            self._reps = self._similarity.prepare([])
+        else:
+            self._similarity = _get_similarity(measure, use_stemmer, model, verbose, batch_size, cache)
+            self._reps = []
+        self._size = 0
+        self.add(documents)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, documents: Iterable[str]) -> None:
+        """ Adds documents to the pool. """
+        documents = list(documents)
+        if self.measure == 'bleu':
+            self._reps = concat_tokens(self._reps, self._similarity.prepare(documents))
+        else:
+            self._reps.extend(self._similarity.prepare(documents))
+        self._size += len(documents)
+
+    def score(
+            self,
+            queries: List[str],
+            n_jobs: int = 1
+    ) -> float:
+        """
+        Calculates the homogenization score of a batch relative to the pool: the mean similarity
+        of each query to all the other documents, in the pool and in the batch. This equals the
+        mean over the query rows of `homogenization_score` on pool + queries, without scoring
+        pool x pool pairs.
+        Args:
+            queries (List[str]): Strings to score. They are not added to the pool.
+            n_jobs (int, optional): Processes scoring ROUGE-L pairs in parallel. Defaults to 1.
+        Returns:
+            float: Homogenization score of the batch.
+        """
+        total = self._size + len(queries)
+        if not queries:
+            raise ValueError("At least one query is needed.")
+        if total < 2:
+            raise ValueError("At least two documents (queries and pool) are needed.")
+
+        if self.measure == 'bleu':
+            corpus_score = 0
+            for doc_score in self._similarity.doc_scores(self._similarity.prepare(queries), pool=self._reps):
+                corpus_score += doc_score / (total - 1)
+            return _finalize(corpus_score, len(queries))
+
+        if self.verbose:
+            print('==> Scoring query pairs')
+        reps = self._reps + self._similarity.prepare(queries)
+        n_jobs = n_jobs if self.measure == 'rougel' else 1
+        doc_scores = [0] * len(queries)
+        corpus_score = 0
+        rows = upper_triangle_scores(self._similarity, reps, n_jobs=n_jobs, pool_size=self._size)
+        for i, scores in tqdm(rows, total=len(queries), disable=(not self.verbose)):
+            k = i - self._size
+            doc_scores[k] += sum(scores[:self._size])
+            # queries after k; earlier ones were added to doc_scores[k] by earlier rows
+            for j, score in enumerate(scores[self._size:], start=k + 1):
+                doc_scores[k] += score
+                doc_scores[j] += score
+            corpus_score += doc_scores[k] / (total - 1)
+        return _finalize(corpus_score, len(queries))
+
+
+def cross_homogenization_score(
+        queries: List[str],
+        reference_pool: Union[List[str], HomogenizationPool],
+        measure: str = 'rougel',
+        use_stemmer: Optional[bool] = False,
+        model: Optional[str] = "microsoft/deberta-base-mnli",
+        verbose: Optional[bool] = True,
+        batch_size: Optional[int] = 64,
+        n_jobs: int = 1,
+        cache: Optional[EmbeddingCache] = None
+) -> float:
+    """
+    Calculates the homogenization score of a batch of documents relative to a reference pool
+    (see `HomogenizationPool.score`). Pass a `HomogenizationPool` to reuse the pool's
+    representations across batches.
+     Args:
+         queries (List[str]): Strings to score.
+         reference_pool (List[str] | HomogenizationPool): Documents to compare against.
+         measure (str, optional): Either 'rougel', 'bertscore', or 'bleu'; ignored for a `HomogenizationPool`. Defaults to 'rougel'.
+         use_stemmer, model, verbose, batch_size, n_jobs, cache: As in `homogenization_score`.
+     Returns:
+         float: Homogenization score of the batch.
+     """
+    if not isinstance(reference_pool, HomogenizationPool):
+        reference_pool = HomogenizationPool(reference_pool, measure=measure, use_stemmer=use_stemmer, model=model,
+                                            verbose=verbose, batch_size=batch_size, cache=cache)
+    return reference_pool.score(queries, n_jobs=n_jobs)
+
+
+class HomogenizationEstimate(NamedTuple):
+    """ A sampled homogenization score with a confidence interval. """
+    score: float
+    lower: float
+    upper: float
+    num_pairs: int
+
+
+def sampled_homogenization_score(
+        data: List[str],
+        measure: str = 'rougel',
+        max_pairs: int = 10000,
+        tolerance: Optional[float] = None,
+        confidence: float = 0.95,
+        interval: str = 'clt',
+        strata: Optional[Sequence] = None,
+        batch_pairs: int = 1000,
+        num_bootstrap: int = 1000,
+        seed: Optional[int] = None,
+        use_stemmer: Optional[bool] = False,
+        model: Optional[str] = "microsoft/deberta-base-mnli",
+        verbose: Optional[bool] = True,
+        batch_size: Optional[int] = 64,
+        cache: Optional[EmbeddingCache] = None
+) -> HomogenizationEstimate:
+    """
+    Estimates the homogenization score (the mean similarity of a document to the other documents)
+    from a random sample of pairs, for corpora too large to score all pairs.
+        Pairs are drawn in batches: a document, then a different document uniformly at random.
+        With `strata` (e.g. the prompt each document was generated from), the first document is
+        drawn from each stratum in proportion to its size and the stratum means are combined,
+        which lowers the variance when similarity differs between strata.
+        Only the documents that appear in sampled pairs are tokenized or encoded.
+     Args:
+         data (List[str]): Strings to score.
+         measure (str, optional): Either 'rougel' or 'bertscore'. Defaults to 'rougel'.
+         max_pairs (int, optional): Budget of pairs to score; never exceeded. Defaults to 10000.
+         tolerance (float, optional): Stop early once the confidence interval is at most this wide
+            on each side of the estimate. Defaults to None (score `max_pairs` pairs).
+         confidence (float, optional): Confidence level of the interval. Defaults to 0.95.
+         interval (str, optional): 'clt' (normal approximation) or 'bootstrap' (percentile interval). Defaults to 'clt'.
+         strata (Sequence, optional): A stratum label per document. Defaults to None (uniform sampling).
+         batch_pairs (int, optional): Pairs scored between two checks of the interval. Defaults to 1000.
+         num_bootstrap (int, optional): Bootstrap resamples for `interval='bootstrap'`. Defaults to 1000.
+         seed (int, optional): Seed of the random generator. Defaults to None.
+         use_stemmer, model, verbose, batch_size, cache: As in `homogenization_score`.
+     Returns:
+         HomogenizationEstimate: Estimated score, lower and upper bounds of the interval, and number of pairs scored.
+     """
+    if len(data) < 2:
+        raise ValueError("At least two documents are needed to sample pairs.")
+    if interval not in ('clt', 'bootstrap'):
+        raise ValueError("Interval must be one of `clt` or `bootstrap`.")
+    similarity = _get_similarity(measure, use_stemmer, model, False, batch_size, cache)
+    rng = np.random.default_rng(seed)
+
+    _, inverse, counts = np.unique(np.asarray(strata if strata is not None else [0] * len(data)),
+                                   return_inverse=True, return_counts=True)
+    members = np.split(np.argsort(inverse, kind='stable'), np.cumsum(counts)[:-1])
+    weights = counts / len(data)
+
+    reps: Dict[int, object] = {}
+    scores: List[List[float]] = [[] for _ in members]
+    num_pairs = 0
+    estimate = (np.nan, np.nan, np.nan)
+    with tqdm(total=max_pairs, disable=(not verbose)) as progress:
+        while num_pairs < max_pairs:
+            # at least two pairs per stratum for a variance estimate, while the budget allows
+            minimum = np.array([max(0, 2 - len(s)) for s in scores])
+            per_batch = _allocate(weights, min(batch_pairs, max_pairs - num_pairs), minimum)
+            for h, m in enumerate(members):
+                first = m[rng.integers(len(m), size=per_batch[h])]
+                second = rng.integers(len(data) - 1, size=per_batch[h])
+                second += second >= first
+                missing = sorted((set(first.tolist()) | set(second.tolist())) - reps.keys())
+                reps.update(zip(missing, similarity.prepare([data[i] for i in missing])))
+                scores[h].extend(similarity.score(reps[i], reps[j]) for i, j in zip(first.tolist(), second.tolist()))
+            num_pairs += int(per_batch.sum())
+            progress.update(int(per_batch.sum()))
+
+            if min(len(s) for s in scores) < 2:
+                continue  # a budget below two pairs per stratum leaves the estimate undefined (nan)
+            estimate = _interval(scores, weights, confidence, interval, num_bootstrap, rng)
+            if tolerance is not None and max(estimate[0] - estimate[1], estimate[2] - estimate[0]) <= tolerance:
+                break
+
+    return HomogenizationEstimate(*(round(float(x), 3) for x in estimate), num_pairs)
+
+
+def _allocate(
+        weights: np.ndarray,
+        budget: int,
+        minimum: np.ndarray
+) -> np.ndarray:
+    """ Splits `budget` pairs between strata: first up to `minimum` pairs each (largest strata first),
+        then the rest in proportion to `weights`, rounded by largest remainder. """
+    counts = np.zeros(len(weights), dtype=int)
+    for h in np.argsort(-weights, kind='stable'):
+        counts[h] = min(minimum[h], budget - counts.sum())
+    quotas = weights * (budget - counts.sum())
+    extra = np.floor(quotas).astype(int)
+    extra[np.argsort(extra - quotas, kind='stable')[:budget - counts.sum() - extra.sum()]] += 1
+    return counts + extra
+
+
+def _interval(
+        scores: List[List[float]],
+        weights: np.ndarray,
+        confidence: float,
+        interval: str,
+        num_bootstrap: int,
+        rng: np.random.Generator
+):
+    """ Stratified mean of the sampled scores, and its confidence interval. """
+    samples = [np.asarray(s, dtype=np.float64) for s in scores]
+    estimate = sum(w * s.mean() for w, s in zip(weights, samples))
+
+    if interval == 'clt':
+        stderr = np.sqrt(sum(w ** 2 * s.var(ddof=1) / len(s) for w, s in zip(weights, samples)))
+        half_width = NormalDist().inv_cdf((1 + confidence) / 2) * stderr
+        return estimate, estimate - half_width, estimate + half_width
+
+    # resample pairs within each stratum
+    resampled = np.zeros(num_bootstrap)
+    for w, s in zip(weights, samples):
+        resampled += w * np.array([s[rng.integers(len(s), size=len(s))].mean() for _ in range(num_bootstrap)])
+    lower, upper = np.quantile(resampled, [(1 - confidence) / 2, (1 + confidence) / 2])
+    return estimate, lower, upper
@@ -1,26 +1,201 @@
-from typing import List
-import nltk
+import itertools
+import os
+import tempfile
+from pathlib import Path
+from typing import Iterable, List, Optional, Union
+
+import numpy as np
+
+from .corpus import Corpus, as_corpus
+from .utils.files import as_documents
+from .utils.hyperloglog import HyperLogLog
+from .utils.ngrams import hash_ngrams, hash_tokens, num_unique, sorted_unique
 
 def ngram_diversity_score(
-        data: List[str],
+        data: Union[List[str], Corpus],
         num_n: int = 4, 
 ) -> float:
     """ Calculates corpus-level ngram diversity based on unique ngrams 
        (e.g., https://arxiv.org/pdf/2202.00666.pdf).
 
     Args:
-        data (List[str]): List of documents. 
+        data (List[str] | Corpus): List of documents. 
         num_n (int): Max ngrams to test up to. Defaults to 5. 
 
     Returns:
         float: ngram diveristy score.
     """
     score = 0 
-    data = ' '.join(data).split(' ') # format to list of words
+    corpus = as_corpus(data) # words are split once and shared with other metrics
 
     for i in range(1, num_n + 1): 
-        ngrams = list(nltk.ngrams(data, i))
+        # integer codes of every ngram; equal ngrams share a code
+        ngrams = corpus.ngram_codes(i)
         # num unique ngrams / all ngrams for each size n 
-        score += len(set(ngrams)) / len(ngrams) 
+        score += num_unique(ngrams) / len(ngrams) 
 
     return round(score, 3)
+
+
+class NgramDiversityCounter:
+    """
+    Keeps the unique-ngram counts needed by `ngram_diversity_score` up to date as documents
+    stream in, without holding the corpus in memory.
+
+    N-grams are identified by stable 64-bit hashes. In 'exact' mode the distinct hashes are
+    kept (exact up to 64-bit hash collisions); once more than `max_keys` are buffered per n-gram
+    size they are spilled to disk, partitioned by their top bits so that each partition can be
+    counted on its own. In 'approx' mode they are counted with a HyperLogLog sketch of fixed size.
+
+    Example Usage:
+    >>> counter = NgramDiversityCounter(num_n=4)
+    >>> for batch in batches:
+    ...     counter.update(batch)
+    >>> counter.score()
+    """
+
+    def __init__(
+            self,
+            num_n: int = 4,
+            mode: str = 'exact',
+            max_keys: int = 10_000_000,
+            partition_bits: int = 6,
+            precision: int = 14,
+            tmp_dir: Optional[str] = None
+    ):
+        """
+        Args:
+            num_n (int): Max ngrams to test up to. Defaults to 4.
+            mode (str, optional): Either 'exact' or 'approx'. Defaults to 'exact'.
+            max_keys (int, optional): Hashes buffered in memory per ngram size before spilling to disk ('exact' mode). Defaults to 10M.
+            partition_bits (int, optional): Spill into 2 ** partition_bits files per ngram size ('exact' mode). Defaults to 6.
+            precision (int, optional): HyperLogLog precision ('approx' mode). Defaults to 14.
+            tmp_dir (str, optional): Directory in which to create the spill directory. Defaults to the system temp dir.
+        """
+        if mode not in ('exact', 'approx'):
+            raise ValueError("Counting mode must be one of `exact` or `approx`.")
+
+        self.num_n = num_n
+        self.mode = mode
+        self.max_keys = max_keys
+        self.partition_bits = partition_bits
+        self.tmp_dir = tmp_dir
+
+        self.totals = [0] * (num_n + 1)
+        self._carry = np.zeros(0, dtype=np.uint64)
+        self._sketches = [HyperLogLog(precision) for _ in range(num_n + 1)] if mode == 'approx' else None
+        self._buffers = [[] for _ in range(num_n + 1)]
+        self._buffered = [0] * (num_n + 1)
+        self._spill_dir = None
+
+    def update(self, documents: Iterable[str]) -> None:
+        """ Adds documents; n-grams span document boundaries, as in `ngram_diversity_score`. """
+        tokens = hash_tokens(itertools.chain.from_iterable(doc.split(' ') for doc in documents))
+        if not len(tokens):
+            return
+        tokens = np.concatenate([self._carry, tokens])
+
+        for n in range(1, self.num_n + 1):
+            # only count ngrams ending in the new tokens; the others were counted last time
+            start = max(0, len(self._carry) - n + 1)
+            hashes = hash_ngrams(tokens[start:], n)
+            self.totals[n] += len(hashes)
+            if self.mode == 'approx':
+                self._sketches[n].add(hashes)
+            else:
+                self._buffer(n, hashes)
+
+        self._carry = tokens[-(self.num_n - 1):] if self.num_n > 1 else tokens[:0]
+
+    def unique(self, n: int) -> float:
+        """ Number of unique ngrams of size n seen so far (estimated in 'approx' mode). """
+        if self.mode == 'approx':
+            return self._sketches[n].count()
+        if self._spill_dir is None:
+            return len(sorted_unique(np.concatenate(self._buffers[n]))) if self._buffers[n] else 0
+
+        self._spill(n)
+        return sum(len(sorted_unique(np.fromfile(path, dtype=np.uint64)))
+                   for path in self._partition_paths(n) if path.exists())
+
+    def score(self) -> float:
+        """ ngram diversity score of the documents seen so far. """
+        score = 0
+        for n in range(1, self.num_n + 1):
+            score += self.unique(n) / self.totals[n]
+        return round(score, 3)
+
+    def close(self) -> None:
+        """ Removes spilled files. """
+        if self._spill_dir is not None:
+            self._spill_dir.cleanup()
+            self._spill_dir = None
+
+    def _buffer(self, n: int, hashes: np.ndarray) -> None:
+        self._buffers[n].append(hashes)
+        self._buffered[n] += len(hashes)
+        if self._buffered[n] <= self.max_keys:
+            return
+
+        # deduplicate first, and only go to disk if that was not enough
+        uniques = sorted_unique(np.concatenate(self._buffers[n]))
+        self._buffers[n] = [uniques]
+        self._buffered[n] = len(uniques)
+        if self._buffered[n] > self.max_keys // 2:
+            self._spill(n)
+
+    def _partition_paths(self, n: int) -> List[Path]:
+        return [Path(self._spill_dir.name) / f"{n}-{p}.u64" for p in range(1 << self.partition_bits)]
+
+    def _spill(self, n: int) -> None:
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.TemporaryDirectory(dir=self.tmp_dir)
+        if not self._buffers[n]:
+            return
+
+        # sorted hashes are contiguous per partition (top bits)
+        uniques = sorted_unique(np.concatenate(self._buffers[n]))
+        partitions = uniques >> np.uint64(64 - self.partition_bits)
+        bounds = np.searchsorted(partitions, np.arange((1 << self.partition_bits) + 1, dtype=np.uint64))
+        for p, path in enumerate(self._partition_paths(n)):
+            if bounds[p] < bounds[p + 1]:
+                with path.open('ab') as f:
+                    uniques[bounds[p]:bounds[p + 1]].tofile(f)
+
+        self._buffers[n] = []
+        self._buffered[n] = 0
+
+
+def streaming_ngram_diversity_score(
+        data: Union[Iterable[str], str, os.PathLike],
+        num_n: int = 4,
+        mode: str = 'exact',
+        batch_size: int = 10000,
+        key: str = 'text',
+        **kwargs
+) -> float:
+    """ Calculates `ngram_diversity_score` over an iterable of documents or a file of documents,
+        without loading the corpus into memory.
+
+    Args:
+        data (Iterable[str] | str): Documents, or path to a `.jsonl` / text file with one document per line.
+        num_n (int): Max ngrams to test up to. Defaults to 4.
+        mode (str, optional): 'exact' (up to 64-bit hash collisions) or 'approx' (HyperLogLog). Defaults to 'exact'.
+        batch_size (int, optional): Number of documents hashed at a time. Defaults to 10000.
+        key (str, optional): Field holding the document in JSONL objects. Defaults to 'text'.
+        **kwargs: Passed on to `NgramDiversityCounter`.
+
+    Returns:
+        float: ngram diveristy score.
+    """
+    counter = NgramDiversityCounter(num_n=num_n, mode=mode, **kwargs)
+    documents = iter(as_documents(data, key=key))
+    try:
+        while True:
+            batch = list(itertools.islice(documents, batch_size))
+            if not batch:
+                break
+            counter.update(batch)
+        return counter.score()
+    finally:
+        counter.close()
@@ -0,0 +1,163 @@
+"""
+Persistent store of pairwise scores, so that reruns and overlapping corpora only compute
+the pairs that have not been scored before.
+"""
+
+import json
+import os
+import sqlite3
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from .utils.hashing import content_hash
+
+
+class PairwiseScoreStore:
+    """
+    Scores of document pairs in a SQLite database, keyed by the measure (with its configuration)
+    and content hashes of the two documents. Each pair holds a score and/or a JSON payload.
+
+    Pairs of symmetric measures are stored once, in hash order; asymmetric pairs (e.g. QUDsim
+    alignments of a source and a target document) are stored in the order given.
+
+    Example Usage:
+    >>> store = PairwiseScoreStore('scores.sqlite')
+    >>> homogenization_score(texts, store=store)  # later runs only score new pairs
+    >>> store.nearest(PairwiseScoreStore.measure_key('rougel', use_stemmer=False), k=5)
+    """
+
+    def __init__(self, path: Union[str, os.PathLike] = ':memory:'):
+        """
+        Args:
+            path (str, optional): Database file, created if needed. Defaults to ':memory:' (not persisted).
+        """
+        self.path = str(path)
+        self._db = sqlite3.connect(self.path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS scores ("
+            "measure TEXT NOT NULL, a TEXT NOT NULL, b TEXT NOT NULL, score REAL, payload TEXT, "
+            "PRIMARY KEY (measure, a, b)) WITHOUT ROWID"
+        )
+        self._db.commit()
+        self._indexed: Optional[List[str]] = None
+
+    @staticmethod
+    def key(text: str) -> str:
+        """ Content hash identifying a document. """
+        return content_hash(text)
+
+    @staticmethod
+    def measure_key(measure: str, **config: Any) -> str:
+        """ Identifies a measure and the configuration its scores depend on, e.g. `measure_key('bertscore', model=...)`. """
+        return f"{measure}:{json.dumps(config, sort_keys=True, default=str)}"
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT count(*) FROM scores").fetchone()[0]
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def get(
+            self,
+            measure: str,
+            a: str,
+            b: str,
+            symmetric: bool = True
+    ) -> Optional[Tuple[Optional[float], Optional[str]]]:
+        """ Returns the (score, payload) of a pair of document hashes, or None if it is not stored. """
+        if symmetric and b < a:
+            a, b = b, a
+        return self._db.execute("SELECT score, payload FROM scores WHERE measure = ? AND a = ? AND b = ?",
+                                (measure, a, b)).fetchone()
+
+    def put_many(
+            self,
+            measure: str,
+            rows: Iterable[Tuple[str, str, Optional[float], Optional[str]]],
+            symmetric: bool = True
+    ) -> None:
+        """ Stores (hash_a, hash_b, score, payload) rows, replacing existing ones. """
+        def normalized():
+            for a, b, score, payload in rows:
+                yield (measure, *((b, a) if symmetric and b < a else (a, b)), score, payload)
+
+        self._db.executemany("INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?, ?)", normalized())
+        self._db.commit()
+
+    def put(
+            self,
+            measure: str,
+            a: str,
+            b: str,
+            score: Optional[float] = None,
+            payload: Optional[str] = None,
+            symmetric: bool = True
+    ) -> None:
+        self.put_many(measure, [(a, b, score, payload)], symmetric=symmetric)
+
+    def pairs(self, measure: str) -> Iterator[Tuple[str, str, Optional[float]]]:
+        """ Yields (hash_a, hash_b, score) for every stored pair of a measure. """
+        yield from self._db.execute("SELECT a, b, score FROM scores WHERE measure = ?", (measure,))
+
+    def nearest(
+            self,
+            measure: str,
+            document: Optional[str] = None,
+            k: int = 10
+    ) -> List[Tuple[str, str, float]]:
+        """
+        The `k` highest-scoring stored pairs of a measure (e.g. the closest near-duplicates), optionally
+        only those involving one document hash.
+        """
+        query = "SELECT a, b, score FROM scores WHERE measure = ? AND score IS NOT NULL"
+        args: List[Any] = [measure]
+        if document is not None:
+            query += " AND (a = ? OR b = ?)"
+            args += [document, document]
+        return self._db.execute(query + " ORDER BY score DESC LIMIT ?", (*args, k)).fetchall()
+
+    def _index_documents(self, hashes: Sequence[str]) -> None:
+        if self._indexed == list(hashes):
+            return
+        self._indexed = list(hashes)
+        self._db.execute("CREATE TEMP TABLE IF NOT EXISTS docs (h TEXT NOT NULL, idx INTEGER PRIMARY KEY)")
+        self._db.execute("DELETE FROM docs")
+        self._db.executemany("INSERT INTO docs VALUES (?, ?)", ((h, i) for i, h in enumerate(hashes)))
+        self._db.execute("CREATE INDEX IF NOT EXISTS docs_h ON docs (h)")
+
+    _KNOWN_PAIRS = (
+        "SELECT min(x.idx, y.idx) AS i, max(x.idx, y.idx) AS j, s.score FROM scores s "
+        "JOIN docs x ON s.a = x.h JOIN docs y ON s.b = y.h "
+        "WHERE s.measure = ? AND x.idx != y.idx AND (s.a != s.b OR x.idx < y.idx)"
+    )
+
+    def known_counts(self, measure: str, hashes: Sequence[str]) -> Dict[int, int]:
+        """ For documents (given by hash, duplicates allowed), the number of other documents they have a stored score with. """
+        self._index_documents(hashes)
+        counts: Dict[int, int] = {}
+        for i, j, _ in self._db.execute(self._KNOWN_PAIRS, (measure,)):
+            counts[i] = counts.get(i, 0) + 1
+            counts[j] = counts.get(j, 0) + 1
+        return counts
+
+    def known_pairs(
+            self,
+            measure: str,
+            hashes: Sequence[str],
+            rows: Optional[range] = None
+    ) -> Iterator[Tuple[int, int, float]]:
+        """
+        Yields (i, j, score) with i < j for the pairs of documents (given by hash, duplicates allowed)
+        of a symmetric measure that are stored, ordered by i then j; optionally only for i in `rows`.
+        """
+        self._index_documents(hashes)
+        query, args = f"SELECT * FROM ({self._KNOWN_PAIRS})", [measure]
+        if rows is not None:
+            query += " WHERE i >= ? AND i < ?"
+            args += [rows.start, rows.stop]
+        yield from self._db.execute(query + " ORDER BY i, j", args)
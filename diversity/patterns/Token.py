@@ -1,6 +1,35 @@
+import itertools
+import heapq
+import os
+from typing import Dict, Iterable, List, Tuple, Union
 
-from typing import List, Tuple
-import nltk 
+import numpy as np
+
+from ..utils.files import as_documents
+from ..utils.ngrams import encode_documents, ngram_codes, ngram_starts
+
+
+def _count_ngrams(
+        data: Iterable[str],
+        n: int,
+        vocab: Dict[str, int]
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """ Counts the n-grams of each sentence (split on spaces) as integer codes.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: Token ids, and for each distinct n-gram
+        its count and the start position (in the token ids) of its first occurrence, ordered by
+        first occurrence.
+    """
+    # Iterate to prevent ngrams from crossing sentence boundaries.
+    ids, offsets = encode_documents((sentence.split(' ') for sentence in data), vocab)
+    starts = ngram_starts(offsets, n)
+    if not len(starts):
+        return ids, np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    _, first, counts = np.unique(ngram_codes(ids, n)[starts], return_index=True, return_counts=True)
+    order = np.argsort(first, kind='stable')
+    return ids, counts[order], starts[first[order]]
 
 
 def token_patterns(
@@ -16,17 +45,88 @@ def token_patterns(
         top_n (int, optional): Top patterns to display. Defaults to 10.
 
     Returns:
-        List[Tuple[str, int]]: Sorted list of top n-gram patterns.
+        List[Tuple[str, int]]: Sorted list of top n-gram patterns (ties in order of first occurrence).
     """
+    vocab: Dict[str, int] = {}
+    ids, counts, firsts = _count_ngrams(data, n, vocab)
 
-    # Iterate to prevent ngrams from crossing sentence boundaries.
-    all_ngrams = []
-    for sentence in data:
-        all_ngrams.extend(list(nltk.ngrams(sentence.split(' '), n)))
-    frequency = nltk.FreqDist(all_ngrams)
+    # counts are in order of first occurrence, so a stable sort keeps ties in that order
+    if 0 < top_n < len(counts):
+        # only the patterns counted at least as often as the top_n-th one can be in the top
+        threshold = np.partition(counts, len(counts) - top_n)[len(counts) - top_n]
+        candidates = np.flatnonzero(counts >= threshold)
+    else:
+        candidates = np.arange(len(counts))
+    top = candidates[np.argsort(-counts[candidates], kind='stable')][:top_n]
+
+    words = list(vocab)
+    return [(' '.join(words[i] for i in ids[start:start + n]), int(count))
+            for start, count in zip(firsts[top].tolist(), counts[top].tolist())]
 
-    sorted_frequency = sorted(frequency.items(), key=lambda kv: kv[1], reverse=True)[:top_n]
 
-    sorted_frequency = [(' '.join(x[0]), x[1]) for x in sorted_frequency]
+class TokenPatternCounter:
+    """
+    Keeps the n-gram pattern counts of `token_patterns` up to date as sentences stream in,
+    holding one count per distinct n-gram rather than the sentences.
+
+    Example Usage:
+    >>> counter = TokenPatternCounter(n=4)
+    >>> for batch in batches:
+    ...     counter.update(batch)
+    >>> counter.top(10)
+    """
 
-    return sorted_frequency
+    def __init__(self, n: int):
+        """
+        Args:
+            n (int): N-gram length.
+        """
+        self.n = n
+        self._vocab: Dict[str, int] = {}
+        # n-grams as tuples of token ids, in order of first occurrence
+        self._counts: Dict[Tuple[int, ...], int] = {}
+
+    def update(self, data: Iterable[str]) -> None:
+        """ Adds sentences; n-grams never cross sentences, as in `token_patterns`. """
+        ids, counts, firsts = _count_ngrams(data, self.n, self._vocab)
+        n = self.n
+        for start, count in zip(firsts.tolist(), counts.tolist()):
+            key = tuple(ids[start:start + n].tolist())
+            self._counts[key] = self._counts.get(key, 0) + count
+
+    def top(self, top_n: int = 10) -> List[Tuple[str, int]]:
+        """ The `top_n` most frequent patterns seen so far, as returned by `token_patterns`. """
+        words = list(self._vocab)
+        # nlargest keeps ties in iteration (first occurrence) order, like a stable sort
+        return [(' '.join(words[i] for i in key), count)
+                for key, count in heapq.nlargest(top_n, self._counts.items(), key=lambda kv: kv[1])]
+
+
+def streaming_token_patterns(
+        data: Union[Iterable[str], str, os.PathLike],
+        n: int,
+        top_n: int = 10,
+        batch_size: int = 10000,
+        key: str = 'text'
+) -> List[Tuple[str, int]]:
+    """ Calculates `token_patterns` over an iterable of sentences or a file of sentences,
+        without loading them all into memory.
+
+    Args:
+        data (Iterable[str] | str): Sentences, or path to a `.jsonl` / text file with one sentence per line.
+        n (int): N-gram length.
+        top_n (int, optional): Top patterns to display. Defaults to 10.
+        batch_size (int, optional): Number of sentences counted at a time. Defaults to 10000.
+        key (str, optional): Field holding the sentence in JSONL objects. Defaults to 'text'.
+
+    Returns:
+        List[Tuple[str, int]]: Sorted list of top n-gram patterns.
+    """
+    counter = TokenPatternCounter(n)
+    sentences = iter(as_documents(data, key=key))
+    while True:
+        batch = list(itertools.islice(sentences, batch_size))
+        if not batch:
+            break
+        counter.update(batch)
+    return counter.top(top_n)
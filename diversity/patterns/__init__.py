@@ -1,2 +1,2 @@
-from .Token import token_patterns
-from .part_of_speech import get_pos, pos_patterns
+from .Token import token_patterns, streaming_token_patterns, TokenPatternCounter
+from .part_of_speech import get_pos, get_pipeline, pos_patterns, pos_patterns_many, PosCache
@@ -1,49 +1,132 @@
-from typing import List, Tuple, Any, Set
+import json
+import os
+import sqlite3
+from typing import Dict, Iterable, List, Optional, Tuple, Set, Union
 
 import spacy
 
+from ..utils.cache import LRUCache
+
+
+_PIPELINES: Dict[str, "spacy.language.Language"] = {}
+
+
+def get_pipeline(model: str = "en_core_web_sm") -> "spacy.language.Language":
+    """ Loads a spaCy tagging pipeline once per process and returns the same instance afterwards. """
+    if model not in _PIPELINES:
+        _PIPELINES[model] = spacy.load(model, enable=["tok2vec", "tagger"])
+    return _PIPELINES[model]
+
+
+class PosCache(LRUCache):
+    """
+    Tokens and part-of-speech tags of sentences, keyed by a hash of the model name and the sentence,
+    kept in memory (least recently used entries are evicted past `max_entries`) and optionally in a
+    SQLite file, so that re-tagging a mostly unchanged corpus only tags the new sentences.
+    """
+
+    def __init__(
+            self,
+            path: Optional[Union[str, os.PathLike]] = None,
+            max_entries: int = 100000
+    ):
+        """
+        Args:
+            path (str, optional): Database file for the on-disk store, created if needed. Defaults to None (memory only).
+            max_entries (int, optional): Sentences kept in memory. Defaults to 100000.
+        """
+        super().__init__(max_entries)
+        self.path = str(path) if path else None
+        self._db: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if self.path and self._db is None:
+            self._db = sqlite3.connect(self.path, timeout=60)
+            self._db.execute("CREATE TABLE IF NOT EXISTS pos (key TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID")
+            self._db.commit()
+        return self._db
+
+    def _load(self, keys: List[str]) -> Dict[str, Tuple[List[str], List[str]]]:
+        found = {}
+        db = self._connect()
+        if db is not None:
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                rows = db.execute(f"SELECT key, value FROM pos WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+                for key, value in rows:
+                    tokens, tags = json.loads(value)
+                    found[key] = (tokens, tags)
+        return found
+
+    def _save(self, items: Dict[str, Tuple[List[str], List[str]]]) -> None:
+        db = self._connect()
+        if db is not None:
+            db.executemany("INSERT OR REPLACE INTO pos VALUES (?, ?)",
+                           ((key, json.dumps(value)) for key, value in items.items()))
+            db.commit()
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def __getstate__(self):
+        # connections cannot be sent to other processes; each process opens its own
+        state = self.__dict__.copy()
+        state['_db'] = None
+        return state
+
+
+_DEFAULT_CACHE = PosCache()
+
+
 def get_pos(
-        data: List[str]
-) -> Tuple[List[str], List[Tuple[str, str]]]:
+        data: List[str],
+        model: str = "en_core_web_sm",
+        n_process: int = 4,
+        batch_size: int = 1000,
+        cache: Optional[PosCache] = None
+) -> Tuple[List[str], List[List[Tuple[str, str]]]]:
     """ Turns a sequence into parts of speech.
 
     Args:
         data (List[str]): Data to tranform into part of speech tags.
+        model (str, optional): spaCy pipeline with a tagger, loaded once per process. Defaults to "en_core_web_sm".
+        n_process (int, optional): Processes tagging in parallel, used when more than `batch_size` sentences
+            need tagging. Defaults to 4.
+        batch_size (int, optional): Sentences per batch sent to the pipeline. Defaults to 1000.
+        cache (PosCache, optional): Cache of tagged sentences to read from and fill (e.g. `PosCache("tags.sqlite")`
+            to keep tags between runs). Defaults to a process-wide in-memory cache.
 
     Returns:
         Tuple[List[str], List[Tuple[str, str]]]: Part-of-speech tags only, tuple of (token, part-of-speech tag).
     """
-    nlp = spacy.load("en_core_web_sm", enable=["tok2vec", "tagger"])
+    cache = cache if cache is not None else _DEFAULT_CACHE
+    keys = [cache.key(model, sentence) for sentence in data]
+    found = cache.get_many(list(dict.fromkeys(keys)))
+
+    missing = {key: sentence for key, sentence in zip(keys, data) if key not in found}
+    if missing:
+        nlp = get_pipeline(model)
+        # worker processes only pay off for large batches
+        docs = nlp.pipe(missing.values(), n_process=n_process if len(missing) > batch_size else 1,
+                        batch_size=batch_size)
+        tagged = {key: ([token.text for token in doc], [token.tag_ for token in doc])
+                  for key, doc in zip(missing, docs)}
+        cache.put_many(tagged)
+        found.update(tagged)
 
     pos_tuples = []
     joined_pos = []
-    joined_text = []
 
-    docs = nlp.pipe(data, n_process=4, batch_size=1000)
-    
-    for doc in docs:
-        joined_text.append(' '.join([token.text for token in doc]))
-        joined_pos.append(' '.join([token.tag_ for token in doc]))
-        pos_tuples.append([(token.text, token.tag_) for token in doc])
+    for key in keys:
+        tokens, tags = found[key]
+        joined_pos.append(' '.join(tags))
+        pos_tuples.append(list(zip(tokens, tags)))
 
     return joined_pos, pos_tuples
 
 
-def _find_sub_list(
-        sl: List[Any],
-        l: List[Any]
-) -> List[Any]:
-    """ Given a pattern and a list of strings, returns sublists matching the pattern. """
-    
-    results = []
-    sll = len(sl)
-    for ind in (i for i,e in enumerate(l) if e==sl[0]):
-        if l[ind:ind+sll]==sl:
-            results.append((ind, ind+sll-1))
-
-    return results
-
-
 def pos_patterns(
         text: List[List[Tuple[str, str]]],
         pattern: str
@@ -57,25 +140,39 @@ def pos_patterns(
     Returns:
         Set[str]: Returns all the string matching the pattern.
     """
+    return pos_patterns_many(text, [pattern])[pattern]
 
-    pos = []
-    word = []
-    
-    # text is a list of lists of tuples (word, part of speech)
-    for doc in text: 
-        pos.append([i[1] for i in doc])
-        word.append([i[0] for i in doc])
-    
-    all_matches = [] 
 
-    # return positions of each tag and the corresponding tokens
-    for w, p in zip(word, pos):
+def pos_patterns_many(
+        text: List[List[Tuple[str, str]]],
+        patterns: Iterable[str]
+) -> Dict[str, Set[str]]:
+    """ Finds the substrings matching each of several part of speech patterns in one pass over the text.
 
-        test = _find_sub_list(pattern.split(), p)
+    Args:
+        text (List[List[Tuple[str, str]]]): Text containing words and part-of-speech tags.
+        patterns (Iterable[str]): Part-of-speech tag patterns to search for.
 
-        if test:
-            for occ in test: 
-                splits = w[int(occ[0]):int(occ[1]+1)]
-                all_matches.append(" ".join(splits))
+    Returns:
+        Dict[str, Set[str]]: For each pattern, all the strings matching it (as `pos_patterns`).
+    """
+    matches: Dict[str, Set[str]] = {}
+    # patterns by length, as tag tuples, so every tag n-gram is looked up once
+    by_length: Dict[int, Dict[Tuple[str, ...], Set[str]]] = {}
+    for pattern in patterns:
+        tags = tuple(pattern.split())
+        matches[pattern] = by_length.setdefault(len(tags), {}).setdefault(tags, set())
+    by_length.pop(0, None)
 
-    return set(all_matches) 
+    # text is a list of lists of tuples (word, part of speech)
+    for doc in text:
+        if not doc:
+            continue
+        words, pos = zip(*doc)
+        for length, wanted in by_length.items():
+            for start in range(len(pos) - length + 1):
+                found = wanted.get(pos[start:start + length])
+                if found is not None:
+                    found.add(" ".join(words[start:start + length]))
+
+    return matches
@@ -1,4 +1,5 @@
 from .qudsim_modules import number_text, get_quds, align
+from .pairwise_store import PairwiseScoreStore
 from .utils import openai
 from tqdm import tqdm
 import itertools
@@ -119,20 +120,25 @@ class AlignmentPair:
         self.aligned_segment_text = aligned_segment_text
 
 
-def _compile_documents(documents: list[str], qg_gpt_model: openai.GPT, config):
-    document_list = []
-    for document in tqdm(documents, total=len(documents), desc="Generating QUDs"):
-        document_obj = Document(document=document)
+def _compile_document(document: str, qg_gpt_model: openai.GPT, config):
+    document_obj = Document(document=document)
 
-        preprocessing_status = document_obj.preprocess_document()
-        if not preprocessing_status:
-            continue
+    preprocessing_status = document_obj.preprocess_document()
+    if not preprocessing_status:
+        return None
 
-        qud_generation_status = document_obj.generate_quds(gpt_model=qg_gpt_model, config=config)
-        if not qud_generation_status:
-            continue
+    qud_generation_status = document_obj.generate_quds(gpt_model=qg_gpt_model, config=config)
+    if not qud_generation_status:
+        return None
+
+    return document_obj
 
-        document_list.append(document_obj)
+def _compile_documents(documents: list[str], qg_gpt_model: openai.GPT, config):
+    document_list = []
+    for document in tqdm(documents, total=len(documents), desc="Generating QUDs"):
+        document_obj = _compile_document(document, qg_gpt_model, config)
+        if document_obj is not None:
+            document_list.append(document_obj)
 
     return document_list
 
@@ -142,12 +148,14 @@ def _custom_serializer(obj):
     raise TypeError(f"Object of type {obj.__class__.__name__} is not JSON serializable")
 
 
-def qudsim(documents: list[str], key=None, config_file=None):
+def qudsim(documents: list[str], key=None, config_file=None, store: PairwiseScoreStore = None):
     """
     Args:
         documents (list[str]): a list of texts to be aligned (all combinations of pairs will be computed)
         key (str): OpenAI Key
         config_file (str): a .yaml or .yml file that contains the necessary configurations (see config.yaml for the default config)
+        store (PairwiseScoreStore): if given, alignments of pairs already in the store (for the same models and
+            configurations) are reused, and new alignments are added; QUDs are only generated for documents in new pairs
 
     Returns:
 
@@ -193,6 +201,9 @@ def qudsim(documents: list[str], key=None, config_file=None):
         print("At least two documents must be provided.")
         return
 
+    if store is not None:
+        return _stored_qudsim(documents, qg_gpt_model, qa_gpt_model, configs, store)
+
     # create document objects (one Document per document)
     document_list = _compile_documents(documents=documents, qg_gpt_model=qg_gpt_model, config=configs)
 
@@ -211,3 +222,56 @@ def qudsim(documents: list[str], key=None, config_file=None):
     
     json_str = json.dumps(alignment_pairs, default=_custom_serializer)
     return json_str
+
+
+def _compile_indexed(documents: list[str], indices: list[int], qg_gpt_model: openai.GPT, config):
+    compiled = {}
+    for i in tqdm(indices, total=len(indices), desc="Generating QUDs"):
+        document_obj = _compile_document(documents[i], qg_gpt_model, config)
+        if document_obj is not None:
+            compiled[i] = document_obj
+    return compiled
+
+
+def _stored_qudsim(documents: list[str], qg_gpt_model: openai.GPT, qa_gpt_model: openai.GPT, configs, store: PairwiseScoreStore):
+    """ `qudsim` reading the alignments of stored pairs and aligning (and storing) the others. """
+    measure = PairwiseScoreStore.measure_key(
+        'qudsim', **{k: configs[k] for k in ('qg_gpt_model', 'qa_gpt_model', 'level', 'threshold', 'max_tries')})
+    hashes = [store.key(document) for document in documents]
+
+    pair_indices = list(itertools.combinations(range(len(documents)), 2))
+    stored = {}
+    for i, j in pair_indices:
+        row = store.get(measure, hashes[i], hashes[j], symmetric=False)
+        if row is not None:
+            stored[(i, j)] = json.loads(row[1])
+
+    # QUDs are only needed for documents in pairs that are not stored: first for documents without
+    # stored pairs (new, or that failed before), then for the others that have a missing pair left
+    missing = [pair for pair in pair_indices if pair not in stored]
+    has_stored = {i for pair in stored for i in pair}
+    new_documents = sorted({i for pair in missing for i in pair} - has_stored)
+    compiled = _compile_indexed(documents, new_documents, qg_gpt_model, configs)
+    usable = set(compiled) | has_stored
+    old_documents = sorted({i for pair in missing for i in pair
+                            if i in has_stored and all(k in usable for k in pair)})
+    compiled.update(_compile_indexed(documents, old_documents, qg_gpt_model, configs))
+
+    pairs = [(i, j) for i, j in pair_indices if (i, j) in stored or (i in compiled and j in compiled)]
+    if not pairs:
+        print("At least two documents must successfully generate QUDs.")
+        return
+
+    alignment_pairs = []
+    for i, j in tqdm(pairs, total=len(pairs), desc='Aligning Document Pairs'):
+        if (i, j) in stored:
+            alignment_pairs.append(stored[(i, j)])
+            continue
+        alignment_pair = AlignmentPair(document1=compiled[i], document2=compiled[j])
+        alignment_pair.align_documents(gpt_model=qa_gpt_model, config=configs)
+        store.put(measure, hashes[i], hashes[j],
+                  payload=json.dumps(alignment_pair, default=_custom_serializer), symmetric=False)
+        alignment_pairs.append(alignment_pair)
+
+    json_str = json.dumps(alignment_pairs, default=_custom_serializer)
+    return json_str
@@ -1,12 +1,16 @@
+import os
+import pickle
+
 import numpy as np
 from nltk.util import ngrams
 
-from tqdm import tqdm
-from typing import List
-from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Union
+from .corpus import Corpus, as_corpus
+from .utils.hashing import content_hash, hash64
+from .utils.ngrams import num_unique, sorted_unique
 
 def self_repetition_score(
-        dataset: List[str],
+        dataset: Union[List[str], Corpus],
         n: int = 4,
         verbose: bool = True
 ) -> float:
@@ -15,27 +19,139 @@ def self_repetition_score(
     repetition of ngrams within the corpus.
 
     Args:
-        dataset (List[str]): A list of documents (strings) to analyze.
+        dataset (List[str] | Corpus): A list of documents (strings) to analyze.
         n (int): Size of the ngrams to check for repetition. Defaults to 4.
-        verbose (bool): enable/disable show progress bar
+        verbose (bool): Unused; kept for backward compatibility.
 
     Returns:
         float: The self-repetition score, averaged over the dataset.
     """
-    total_sum = 0
-    
-    # Get all unique ngrams per doc
-    ngram_docs = [list(set([' '.join(ngram) for ngram in ngrams(doc.split(), n)])) for doc in dataset]
+    # Get all unique ngrams per doc, as integer codes paired with their document
+    codes, doc_index = as_corpus(dataset).doc_ngram_codes(n)
+    num_codes = np.uint64(num_unique(codes))
+    pairs = sorted_unique(doc_index.astype(np.uint64) * num_codes + codes.astype(np.uint64))
+    pair_docs, pair_codes = (pairs // num_codes).astype(np.intp), (pairs % num_codes).astype(np.intp)
     
-    # Count occurrences of unique ngrams across whole dataset
-    all_ngrams = sum(ngram_docs, [])
-    ngram_counts = Counter(all_ngrams)
-
-    for ngram_doc in tqdm(ngram_docs, desc="Calculating self-repetition score", disable=(not verbose)):
-        # Find the total occurrence of an n-gram and subtract current doc's n-gram count
-        # to get the count of occurrences of an n-gram in other docs
-        sum_ni = sum([ngram_counts[ngram] for ngram in ngram_doc]) - len(ngram_doc)
-        
-        # add-one to avoid zero error
-        total_sum += np.log(sum_ni + 1)
-    return total_sum / len(dataset)
\ No newline at end of file
+    # Count occurrences of unique ngrams across whole dataset (number of docs containing each)
+    ngram_counts = np.bincount(pair_codes, minlength=int(num_codes))
+
+    # Find the total occurrence of an n-gram and subtract current doc's n-gram count
+    # to get the count of occurrences of an n-gram in other docs
+    sum_ni = np.bincount(pair_docs, weights=ngram_counts[pair_codes] - 1, minlength=len(dataset))
+
+    # add-one to avoid zero error
+    return np.log(sum_ni + 1).sum() / len(dataset)
+
+class SelfRepetitionIndex:
+    """
+    Cross-document ngram counts behind `self_repetition_score`, kept up to date as documents
+    are added or removed, so that a growing pool of documents does not need to be re-scored
+    from scratch. Updating costs time proportional to the batch (and to how many documents
+    share its ngrams), not to the size of the pool.
+
+    N-grams are keyed by stable 64-bit hashes, and the index can be saved to and loaded from disk.
+
+    Example Usage:
+    >>> index = SelfRepetitionIndex(n=4)
+    >>> index.add(first_batch)
+    >>> index.add(second_batch)  # same as self_repetition_score(first_batch + second_batch)
+    >>> index.save("index.pkl")
+    >>> index = SelfRepetitionIndex.load("index.pkl")
+    """
+
+    def __init__(self, n: int = 4):
+        """
+        Args:
+            n (int): Size of the ngrams to check for repetition. Defaults to 4.
+        """
+        self.n = n
+        self._next_id = 0
+        # doc id -> unique ngram hashes of the doc
+        self._doc_ngrams: Dict[int, List[int]] = {}
+        # doc id -> occurrences of the doc's ngrams in other docs
+        self._sum_ni: Dict[int, int] = {}
+        # ngram hash -> ids of the docs containing it
+        self._postings: Dict[int, Set[int]] = {}
+        # content hash -> ids of the docs with that text
+        self._doc_ids: Dict[str, List[int]] = {}
+        self._log_sum = 0.0
+
+    def __len__(self) -> int:
+        return len(self._doc_ngrams)
+
+    def add(self, dataset: Iterable[str]) -> float:
+        """ Adds documents to the index and returns the updated score. """
+        before = {}
+        for doc in dataset:
+            doc_id = self._next_id
+            self._next_id += 1
+            self._doc_ids.setdefault(content_hash(doc), []).append(doc_id)
+
+            ngram_doc = list({hash64(' '.join(ngram)) for ngram in ngrams(doc.split(), self.n)})
+            self._doc_ngrams[doc_id] = ngram_doc
+            self._sum_ni[doc_id] = 0
+            before[doc_id] = None
+
+            for ngram in ngram_doc:
+                docs = self._postings.setdefault(ngram, set())
+                for other in docs:
+                    before.setdefault(other, self._sum_ni[other])
+                    self._sum_ni[other] += 1
+                self._sum_ni[doc_id] += len(docs)
+                docs.add(doc_id)
+
+        self._update_log_sum(before)
+        return self.score()
+
+    def remove(self, dataset: Iterable[str]) -> float:
+        """ Removes documents (one indexed copy per given text) and returns the updated score. """
+        before = {}
+        for doc in dataset:
+            key = content_hash(doc)
+            if not self._doc_ids.get(key):
+                raise KeyError(f"Document is not in the index: {doc[:50]!r}")
+            doc_id = self._doc_ids[key].pop()
+            if not self._doc_ids[key]:
+                del self._doc_ids[key]
+
+            for ngram in self._doc_ngrams.pop(doc_id):
+                docs = self._postings[ngram]
+                docs.discard(doc_id)
+                if not docs:
+                    del self._postings[ngram]
+                for other in docs:
+                    before.setdefault(other, self._sum_ni[other])
+                    self._sum_ni[other] -= 1
+
+            sum_ni = self._sum_ni.pop(doc_id)
+            self._log_sum -= np.log(before.pop(doc_id, sum_ni) + 1)
+
+        self._update_log_sum(before)
+        return self.score()
+
+    def score(self) -> float:
+        """ The self-repetition score of the indexed documents. """
+        if not self._doc_ngrams:
+            return 0.0
+        return self._log_sum / len(self)
+
+    def save(self, path: Union[str, os.PathLike]) -> None:
+        """ Writes the index to `path`. """
+        with open(path, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path: Union[str, os.PathLike]) -> "SelfRepetitionIndex":
+        """ Reads an index written by `save`. """
+        with open(path, 'rb') as f:
+            index = pickle.load(f)
+        if not isinstance(index, cls):
+            raise TypeError(f"{path} does not contain a {cls.__name__}.")
+        return index
+
+    def _update_log_sum(self, before: Dict[int, Optional[int]]) -> None:
+        # before[doc] is the doc's count prior to this update, or None for docs added in it
+        for doc_id, old in before.items():
+            if old is not None:
+                self._log_sum -= np.log(old + 1)
+            self._log_sum += np.log(self._sum_ni[doc_id] + 1)
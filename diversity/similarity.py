@@ -0,0 +1,465 @@
+"""
+Pairwise document similarities used by `homogenization_score`.
+
+Each similarity turns every document into a representation once (`prepare`) and then
+scores pairs of representations, so that documents are not re-processed for every pair.
+"""
+
+import math
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+from rouge_score import tokenizers
+from tqdm import tqdm
+from transformers import AutoModel, AutoTokenizer, GPT2Tokenizer, RobertaTokenizer
+
+from .embedding import EmbeddingCache
+from .pairwise_store import PairwiseScoreStore
+from .utils.ngrams import doc_ngram_codes, encode_documents
+from .utils.workers import init_worker, local_worker, worker_state
+
+
+class RougeL:
+    """
+    ROUGE-L F-measure, identical to `rouge_score.rouge_scorer.RougeScorer(['rougeL'])`.
+
+    Documents are tokenized (and optionally stemmed) once, and the longest common subsequence
+    is computed with the bit-parallel algorithm of Allison and Dix (1986) instead of a DP table.
+    The F-measure is symmetric, so only unordered pairs need to be scored.
+    """
+
+    symmetric = True
+
+    def __init__(self, use_stemmer: bool = False):
+        self.use_stemmer = use_stemmer
+        self._tokenizer = tokenizers.DefaultTokenizer(use_stemmer=use_stemmer)
+        self._vocab: Dict[str, int] = {}
+
+    def prepare(self, data: Sequence[str]) -> List[Tuple[Dict[int, int], List[int]]]:
+        """ Returns, per document, a bitmask of the positions of each token and the token ids. """
+        reps = []
+        for text in data:
+            ids = [self._vocab.setdefault(t, len(self._vocab)) for t in self._tokenizer.tokenize(text)]
+            masks: Dict[int, int] = {}
+            for position, token in enumerate(ids):
+                masks[token] = masks.get(token, 0) | (1 << position)
+            reps.append((masks, ids))
+        return reps
+
+    @staticmethod
+    def score(a: Tuple[Dict[int, int], List[int]], b: Tuple[Dict[int, int], List[int]]) -> float:
+        masks, a_ids = a
+        _, b_ids = b
+        if not a_ids or not b_ids:
+            return 0
+
+        lcs = _lcs_length(masks, len(a_ids), b_ids)
+        precision = lcs / len(a_ids)
+        recall = lcs / len(b_ids)
+        if precision + recall > 0:
+            return 2 * precision * recall / (precision + recall)
+        return 0.0
+
+    def score_many(self, a, others: Sequence) -> List[float]:
+        return [self.score(a, b) for b in others]
+
+    @property
+    def store_key(self) -> str:
+        """ Key of this measure and configuration in a `PairwiseScoreStore`. """
+        return PairwiseScoreStore.measure_key('rougel', use_stemmer=bool(self.use_stemmer))
+
+
+# layer whose hidden states BERTScore uses, from `bert_score.utils.model2layers`
+BERTSCORE_LAYERS: Dict[str, int] = {
+    'bert-base-uncased': 9,
+    'bert-large-uncased': 18,
+    'bert-base-multilingual-cased': 9,
+    'distilbert-base-uncased': 5,
+    'roberta-base': 10,
+    'roberta-large': 17,
+    'roberta-large-mnli': 19,
+    'xlm-roberta-base': 9,
+    'xlm-roberta-large': 17,
+    'microsoft/deberta-base': 9,
+    'microsoft/deberta-base-mnli': 9,
+    'microsoft/deberta-large': 16,
+    'microsoft/deberta-large-mnli': 18,
+    'microsoft/deberta-xlarge': 18,
+    'microsoft/deberta-xlarge-mnli': 40,
+}
+
+_BERTSCORE_MODELS: Dict[str, Tuple[Any, Any, torch.device]] = {}
+
+
+def _get_bertscore_model(model: str) -> Tuple[Any, Any, torch.device]:
+    """ Loads a tokenizer and encoder once per process and returns the same instances afterwards. """
+    if model not in _BERTSCORE_MODELS:
+        device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        encoder = AutoModel.from_pretrained(model).to(device).eval()
+        # the slow tokenizers, like `bert_score`
+        _BERTSCORE_MODELS[model] = (AutoTokenizer.from_pretrained(model, use_fast=False), encoder, device)
+    return _BERTSCORE_MODELS[model]
+
+
+def _sent_encode(tokenizer: Any, text: str) -> List[int]:
+    """ Token ids of `text`, as `bert_score.utils.sent_encode` computes them. """
+    text = text.strip()
+    if not text:
+        # just the special tokens (`build_inputs_with_special_tokens([])`)
+        return tokenizer.encode('', add_special_tokens=True)
+    # GPT-2 style byte-level BPE tokenizers encode the first word like the others
+    prefix = {'add_prefix_space': True} if isinstance(tokenizer, (GPT2Tokenizer, RobertaTokenizer)) else {}
+    return tokenizer.encode(text, add_special_tokens=True, max_length=tokenizer.model_max_length,
+                            truncation=True, **prefix)
+
+
+class BertScore:
+    """
+    BERTScore F1 (Zhang et al. 2020) with the defaults of the `bert_score` package: hidden states
+    of a fixed layer, no idf weighting, no baseline rescaling. Documents are tokenized like
+    `bert_score.utils.sent_encode`; the CLS and SEP tokens take part in greedy matching but,
+    with weight 0, are left out of the precision and recall averages.
+
+    Each document's contextual token embeddings are computed once (and kept in `cache`, if given);
+    pairs are then scored by greedy matching on normalized embeddings, one document against a
+    block of others at a time. F1 is symmetric, so only unordered pairs need to be scored.
+    """
+
+    symmetric = True
+
+    def __init__(
+            self,
+            model: str = 'microsoft/deberta-base-mnli',
+            num_layers: Optional[int] = None,
+            batch_size: int = 64,
+            verbose: bool = False,
+            cache: Optional[EmbeddingCache] = None,
+            block_tokens: int = 1 << 16
+    ):
+        """
+        Args:
+            model (str, optional): Hugging Face model to use. Defaults to 'microsoft/deberta-base-mnli'.
+            num_layers (int, optional): Layer to take embeddings from. Defaults to `BERTSCORE_LAYERS[model]`,
+                or the last layer for other models.
+            batch_size (int, optional): Documents per forward pass. Defaults to 64.
+            verbose (bool, optional): Whether to display progress bar. Defaults to False.
+            cache (EmbeddingCache, optional): Cache of token embeddings across calls. Defaults to None.
+            block_tokens (int, optional): Tokens of other documents compared at a time. Defaults to 65536.
+        """
+        self.model = model
+        self.num_layers = num_layers if num_layers is not None else BERTSCORE_LAYERS.get(model)
+        self.batch_size = batch_size
+        self.verbose = verbose
+        self.cache = cache
+        self.block_tokens = block_tokens
+
+    def prepare(self, data: Sequence[str]) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """ Returns, per document, its L2-normalized token embeddings (num_tokens x dim) and token weights
+            (0 for CLS and SEP, 1 otherwise). """
+        texts = list(dict.fromkeys(data))
+        found: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        if self.cache is not None:
+            name = f"{self.model}@{self.num_layers}"
+            for text in texts:
+                embeddings = self.cache.get(self.cache.key(name, text))
+                weights = self.cache.get(self.cache.key(f"{name}:weights", text))
+                if embeddings is not None and weights is not None:
+                    found[text] = (embeddings, weights)
+
+        missing = [text for text in texts if text not in found]
+        for text, (embeddings, weights) in zip(missing, self._encode(missing)):
+            found[text] = (embeddings, weights)
+            if self.cache is not None:
+                self.cache.put(self.cache.key(name, text), embeddings)
+                self.cache.put(self.cache.key(f"{name}:weights", text), weights)
+
+        return [found[text] for text in data]
+
+    def _encode(self, texts: List[str]) -> List[Tuple[np.ndarray, np.ndarray]]:
+        if not texts:
+            return []
+        tokenizer, encoder, device = _get_bertscore_model(self.model)
+        ids = [_sent_encode(tokenizer, text) for text in texts]
+        ignored = {tokenizer.cls_token_id, tokenizer.sep_token_id}
+        pad = tokenizer.pad_token_id or 0
+
+        # batches of similar length waste less compute on padding
+        order = sorted(range(len(texts)), key=lambda i: len(ids[i]))
+        encoded: List[Optional[Tuple[np.ndarray, np.ndarray]]] = [None] * len(texts)
+        for start in tqdm(range(0, len(order), self.batch_size), disable=(not self.verbose)):
+            indices = order[start:start + self.batch_size]
+            width = max(len(ids[i]) for i in indices)
+            input_ids = torch.tensor([ids[i] + [pad] * (width - len(ids[i])) for i in indices])
+            attention_mask = torch.tensor([[1] * len(ids[i]) + [0] * (width - len(ids[i])) for i in indices])
+            with torch.no_grad():
+                hidden = encoder(input_ids.to(device), attention_mask=attention_mask.to(device),
+                                 output_hidden_states=True).hidden_states
+            layer = hidden[self.num_layers if self.num_layers is not None else -1]
+            layer = torch.nn.functional.normalize(layer.float(), dim=-1).cpu()
+            for row, i in enumerate(indices):
+                weights = np.array([t not in ignored for t in ids[i]], dtype=np.float32)
+                encoded[i] = (layer[row, :len(ids[i])].numpy(), weights)
+        return encoded
+
+    @property
+    def store_key(self) -> str:
+        """ Key of this measure and configuration in a `PairwiseScoreStore`. """
+        return PairwiseScoreStore.measure_key('bertscore', model=self.model, num_layers=self.num_layers)
+
+    def score(self, a: Tuple[np.ndarray, np.ndarray], b: Tuple[np.ndarray, np.ndarray]) -> float:
+        return self.score_many(a, [b])[0]
+
+    def score_many(
+            self,
+            a: Tuple[np.ndarray, np.ndarray],
+            others: Sequence[Tuple[np.ndarray, np.ndarray]]
+    ) -> List[float]:
+        """ F1 of `a` with each of `others`; 0 when either document has no weighted tokens. """
+        scores = np.zeros(len(others), dtype=np.float32)
+        a_embeddings, a_weights = a
+        a_total = a_weights.sum()
+        if a_total == 0:
+            return scores.tolist()
+
+        lengths = np.array([len(b[1]) for b in others])
+        totals = np.array([b[1].sum() for b in others])
+        nonempty = np.flatnonzero(totals)
+        start = 0
+        while start < len(nonempty):
+            # blocks of documents with about `block_tokens` tokens between them
+            stop = start + max(1, int(np.searchsorted(np.cumsum(lengths[nonempty[start:]]), self.block_tokens)))
+            block = nonempty[start:stop]
+            sim = a_embeddings @ np.concatenate([others[j][0] for j in block]).T
+            weights = np.concatenate([others[j][1] for j in block])
+            offsets = np.concatenate(([0], np.cumsum(lengths[block])[:-1]))
+            # precision: each token of `a` matched to its most similar token in the other document
+            precision = a_weights @ np.maximum.reduceat(sim, offsets, axis=1) / a_total
+            # recall: each token of the other document matched to its most similar token in `a`
+            recall = np.add.reduceat(sim.max(axis=0) * weights, offsets) / totals[block]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                f1 = 2 * precision * recall / (precision + recall)
+            scores[block] = np.nan_to_num(f1, nan=0.0)
+            start = stop
+        return scores.tolist()
+
+
+# language-dependent part of the 13a tokenizer of sacrebleu (used by `evaluate`'s bleu)
+_13A_RULES = [
+    (re.compile(r'([\{-\~\[-\` -\&\(-\+\:-\@\/])'), r' \1 '),
+    # period and comma, unless preceded or followed by a digit
+    (re.compile(r'([^0-9])([\.,])'), r'\1 \2 '),
+    (re.compile(r'([\.,])([^0-9])'), r' \1 \2'),
+    # dash, when preceded by a digit
+    (re.compile(r'([0-9])(-)'), r'\1 \2 '),
+]
+
+
+def tokenize_13a(text: str) -> List[str]:
+    """ Splits text into tokens like the 13a tokenizer of sacrebleu (mteval-v13a). """
+    text = text.replace('<skipped>', '').replace('-\n', '').replace('\n', ' ')
+    if '&' in text:
+        text = text.replace('&quot;', '"').replace('&amp;', '&').replace('&lt;', '<').replace('&gt;', '>')
+    text = f' {text} '
+    for pattern, replacement in _13A_RULES:
+        text = pattern.sub(replacement, text)
+    return text.split()
+
+
+class Bleu:
+    """
+    BLEU of each document as the single reference for all the other documents as hypotheses,
+    identical to `evaluate.load("bleu").compute(predictions=others, references=[[doc]] * len(others))`
+    (13a tokenization, up to 4-grams, no smoothing).
+
+    Instead of tokenizing and counting n-grams N times per document, the n-gram counts of every
+    document are computed once. With c_i(g) the count of n-gram g in document i and s_t(g) the
+    number of documents that contain g at least t times, the clipped matches of all others
+    against document i are
+
+        sum over j != i of sum_g min(c_j(g), c_i(g)) = sum_g sum_{t <= c_i(g)} (s_t(g) - 1),
+
+    so one sort of (g, t) keys per n-gram order gives the matches of every document.
+    """
+
+    def __init__(self, max_order: int = 4):
+        self.max_order = max_order
+        self._vocab: Dict[str, int] = {}
+
+    def prepare(self, data: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """ Returns the tokens of all documents encoded as ids, and the offsets of each document (see `encode_documents`). """
+        return encode_documents((tokenize_13a(text) for text in data), self._vocab)
+
+    def doc_scores(
+            self,
+            tokens: Tuple[np.ndarray, np.ndarray],
+            pool: Optional[Tuple[np.ndarray, np.ndarray]] = None
+    ) -> List[float]:
+        """
+        BLEU of every other document against each document of `tokens`. The other documents also
+        include those of `pool`, if given (prepared by the same instance), which are not scored.
+        """
+        first = 0
+        if pool is not None:
+            first = len(pool[1]) - 1
+            tokens = concat_tokens(pool, tokens)
+        ids, offsets = tokens
+        lengths = np.diff(offsets)
+        matches = np.stack([_clipped_matches(*doc_ngram_codes(ids, offsets, n), len(lengths))
+                            for n in range(1, self.max_order + 1)], axis=1)
+
+        total_length = int(lengths.sum())
+        total_possible = [int(np.maximum(lengths - n + 1, 0).sum()) for n in range(1, self.max_order + 1)]
+        scores = []
+        for length, doc_matches in zip(lengths[first:].tolist(), matches[first:].tolist()):
+            possible = [total - max(length - n + 1, 0) for n, total in enumerate(total_possible, start=1)]
+            scores.append(_bleu(doc_matches, possible, total_length - length, length * (len(lengths) - 1)))
+        return scores
+
+
+def concat_tokens(a: Tuple[np.ndarray, np.ndarray], b: Tuple[np.ndarray, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """ Appends the documents of `b` to those of `a`, both as (ids, offsets). """
+    return np.concatenate((a[0], b[0])), np.concatenate((a[1], a[1][-1] + b[1][1:]))
+
+
+def _clipped_matches(codes: np.ndarray, docs: np.ndarray, num_docs: int) -> np.ndarray:
+    """ For each document i, the sum over documents j != i of the clipped n-gram matches min(c_j(g), c_i(g)). """
+    if len(codes) == 0:
+        return np.zeros(num_docs, dtype=np.int64)
+
+    # occurrences sorted by (n-gram, document); the t-th occurrence of g in a document gets key (g, t)
+    keys = codes.astype(np.uint64) * np.uint64(num_docs) + docs.astype(np.uint64)
+    order = np.argsort(keys, kind='stable')
+    keys, docs = keys[order], docs[order]
+    run_start = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    t = np.arange(len(keys)) - np.repeat(run_start, np.diff(np.append(run_start, len(keys))))
+    pair_keys = (keys // np.uint64(num_docs)) * np.uint64(t.max() + 1) + t.astype(np.uint64)
+
+    # s_t(g): number of documents with key (g, t)
+    _, inverse, counts = np.unique(pair_keys, return_inverse=True, return_counts=True)
+    return np.rint(np.bincount(docs, weights=counts[inverse.ravel()] - 1, minlength=num_docs)).astype(np.int64)
+
+
+def _bleu(matches: List[int], possible: List[int], translation_length: int, reference_length: int) -> float:
+    """ BLEU from corpus-level statistics, as in `compute_bleu` of the TensorFlow NMT code used by `evaluate`. """
+    max_order = len(matches)
+    precisions = [float(m) / p if p > 0 else 0.0 for m, p in zip(matches, possible)]
+    if min(precisions) > 0:
+        p_log_sum = sum((1. / max_order) * math.log(p) for p in precisions)
+        geo_mean = math.exp(p_log_sum)
+    else:
+        geo_mean = 0
+    if translation_length == 0 or reference_length == 0:
+        # undefined brevity penalty (empty documents)
+        return 0.0
+
+    ratio = float(translation_length) / reference_length
+    bp = 1. if ratio > 1.0 else math.exp(1 - 1. / ratio)
+    return geo_mean * bp
+
+
+def _lcs_length(masks: Dict[int, int], length: int, tokens: List[int]) -> int:
+    """ Length of the longest common subsequence of a sequence (given as token -> position bitmask) and `tokens`. """
+    full = (1 << length) - 1
+    v = full
+    for token in tokens:
+        u = v & masks.get(token, 0)
+        v = ((v + u) | (v - u)) & full
+    return length - v.bit_count()
+
+
+def _score_rows(rows: range) -> List[List[float]]:
+    """ Scores rows against the pool and every later document: [[s(i, j) for j < pool_size or j > i] for i in rows]. """
+    state = worker_state()
+    similarity, reps, pool_size = state['similarity'], state['reps'], state['pool_size']
+    return [similarity.score_many(reps[i], reps[:pool_size] + reps[i + 1:]) for i in rows]
+
+
+def upper_triangle_scores(
+        similarity,
+        reps: List[Any],
+        n_jobs: int = 1,
+        pairs_per_task: int = 20000,
+        pool_size: int = 0
+) -> Iterator[Tuple[int, List[float]]]:
+    """
+    Yields (i, [s(i, j) for j > i]) for every document i in order, spreading the rows over
+    `n_jobs` processes; each worker receives the representations once.
+    With `pool_size`, the first `pool_size` documents are a reference pool: only the later
+    documents are rows, and their scores start with the scores against the pool
+    ([s(i, j) for j < pool_size] + [s(i, j) for j > i]).
+    """
+    n = len(reps)
+    # group rows into tasks of roughly `pairs_per_task` pairs
+    tasks, start, pairs = [], pool_size, 0
+    for i in range(pool_size, n):
+        pairs += pool_size + n - 1 - i
+        if pairs >= pairs_per_task or i == n - 1:
+            tasks.append(range(start, i + 1))
+            start, pairs = i + 1, 0
+
+    state = {'similarity': similarity, 'reps': reps, 'pool_size': pool_size}
+    if n_jobs > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=init_worker, initargs=(state,)) as executor:
+            for rows, scores in zip(tasks, executor.map(_score_rows, tasks)):
+                yield from zip(rows, scores)
+    else:
+        with local_worker(state):
+            for rows in tasks:
+                yield from zip(rows, _score_rows(rows))
+
+
+def _score_selected(task: List[Tuple[int, List[int]]]) -> List[List[float]]:
+    state = worker_state()
+    similarity, reps = state['similarity'], state['reps']
+    return [similarity.score_many(reps[i], [reps[j] for j in cols]) for i, cols in task]
+
+
+class PairScorer:
+    """
+    Scores selected pairs of documents, spread over `n_jobs` processes that receive the
+    representations once, for as many calls to `score` as needed.
+    """
+
+    def __init__(self, similarity, reps: List[Any], n_jobs: int = 1, pairs_per_task: int = 20000):
+        self.similarity = similarity
+        self.reps = reps
+        self.n_jobs = n_jobs
+        self.pairs_per_task = pairs_per_task
+        self._executor = None
+
+    def __enter__(self):
+        if self.n_jobs > 1:
+            self._executor = ProcessPoolExecutor(max_workers=self.n_jobs, initializer=init_worker,
+                                                 initargs=({'similarity': self.similarity, 'reps': self.reps},))
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def score(self, rows: List[Tuple[int, List[int]]]) -> Iterator[Tuple[int, List[int], List[float]]]:
+        """ Yields (i, cols, [s(i, j) for j in cols]) for each (i, cols) of `rows`, in order. """
+        tasks, task, pairs = [], [], 0
+        for i, cols in rows:
+            task.append((i, cols))
+            pairs += len(cols)
+            if pairs >= self.pairs_per_task:
+                tasks.append(task)
+                task, pairs = [], 0
+        if task:
+            tasks.append(task)
+
+        if self._executor is not None:
+            results = self._executor.map(_score_selected, tasks)
+            for task, scores in zip(tasks, results):
+                for (i, cols), row_scores in zip(task, scores):
+                    yield i, cols, row_scores
+        else:
+            with local_worker({'similarity': self.similarity, 'reps': self.reps}):
+                for task in tasks:
+                    for (i, cols), row_scores in zip(task, _score_selected(task)):
+                        yield i, cols, row_scores
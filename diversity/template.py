@@ -1,23 +1,133 @@
+import gzip
+import itertools
+import os
+import pickle
 import re
+from collections import deque
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Optional
-from .functions import extract_patterns
-from typing import Dict, Iterable, List, Optional
+from .functions import extract_patterns, match_patterns
+from .corpus import Corpus
+from .utils.aho_corasick import AhoCorasick
+from .utils.files import as_documents
+from .utils.workers import init_worker, worker_state
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+
+class TemplateLibrary(Mapping):
+    """
+    Templates mined once from a reference corpus (part-of-speech pattern -> matching text), together
+    with the automaton matching them, that can be saved and applied to new corpora without tagging.
+
+    A library can be passed as `templates` wherever a templates dictionary is accepted; the template
+    metrics then reuse its automaton.
+
+    Example Usage:
+    >>> library = TemplateLibrary.mine(reference_texts, n=5, top_n=100)
+    >>> library.save('templates.pkl.gz')
+    >>> library = TemplateLibrary.load('templates.pkl.gz')
+    >>> library.template_rate(new_texts), template_rate(new_texts, templates=library)
+    """
+
+    # version of the saved format, checked on load
+    VERSION = 1
+
+    def __init__(
+            self,
+            templates: Dict[str, Iterable[str]],
+            n: Optional[int] = None,
+            top_n: Optional[int] = None
+    ):
+        """
+        Args:
+            templates (Dict[str, Iterable[str]]): Templates, e.g. as returned by `extract_patterns`.
+            n (int, optional): N-gram size the templates were mined with, for reference. Defaults to None.
+            top_n (int, optional): Number of patterns mined, for reference. Defaults to None.
+        """
+        self.templates: Dict[str, Set[str]] = {pattern: set(texts) for pattern, texts in templates.items()}
+        self.n = n
+        self.top_n = top_n
+        self.matcher = AhoCorasick(_gather_substrings(self.templates))
+
+    @classmethod
+    def mine(
+            cls,
+            data: Union[List[str], Corpus],
+            n: int = 5,
+            top_n: int = 100
+    ) -> "TemplateLibrary":
+        """ Extracts the templates of a corpus (see `extract_patterns`). """
+        return cls(extract_patterns(data, n=n, top_n=top_n), n=n, top_n=top_n)
+
+    def __getitem__(self, pattern: str) -> Set[str]:
+        return self.templates[pattern]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.templates)
+
+    def __len__(self) -> int:
+        return len(self.templates)
+
+    def __repr__(self) -> str:
+        return f"TemplateLibrary({len(self)} patterns, {len(self.matcher)} substrings, n={self.n})"
+
+    def template_rate(self, data: Union[List[str], Corpus]) -> float:
+        """ `template_rate` of a corpus with these templates. """
+        return template_rate(data, templates=self)
+
+    def templates_per_token(self, data: Union[List[str], Corpus]) -> List[float]:
+        """ `templates_per_token` of a corpus with these templates. """
+        return templates_per_token(data, templates=self)
+
+    def match(self, text: str) -> List[Tuple[str, str]]:
+        """ `match_patterns` of a text with these templates. """
+        return match_patterns(text, self.templates, matcher=self.matcher)
+
+    def save(self, path: Union[str, os.PathLike]) -> None:
+        """ Writes the library, including its automaton, to `path` (gzip-compressed pickle). """
+        state = {"version": self.VERSION, "templates": self.templates, "n": self.n, "top_n": self.top_n,
+                 "matcher": self.matcher}
+        with gzip.open(path, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path: Union[str, os.PathLike]) -> "TemplateLibrary":
+        """ Reads a library written by `save` (only load files from trusted sources: they are pickles). """
+        with gzip.open(path, 'rb') as f:
+            state = pickle.load(f)
+        if not isinstance(state, dict) or "version" not in state:
+            raise TypeError(f"{path} does not contain a {cls.__name__}.")
+        if state["version"] != cls.VERSION:
+            raise ValueError(f"{path} was saved in format version {state['version']}, "
+                             f"this version of the package reads version {cls.VERSION}.")
+        library = cls.__new__(cls)
+        library.templates, library.n, library.top_n = state["templates"], state["n"], state["top_n"]
+        library.matcher = state["matcher"]
+        return library
 
 
 def template_rate(
-    data: List[str],
+    data: Union[List[str], Corpus],
     templates: Optional[Dict[str, Iterable[str]]] = None,
     shard_size: int = 500,
-        
+    matcher: Union[str, AhoCorasick] = "aho-corasick",
+    n_jobs: int = 1,
+    chunk_size: int = 1000,
 ) -> float:
     """ 
     Calculates the template rate (fraction of texts in a corpus that contain at least 1 template)
     for a set of documents (corpus-level), following https://arxiv.org/abs/2407.00211.  
 
     Args:
-        data (List[str]): A list of strings to score.
+        data (List[str] | Corpus): A list of strings to score.
         templates (dict, optional): Dictionary containing the templates extracted from the corpus. Defaults to None.
-        shard_size (int, optional): Size of regex shards to compile. Defaults to 500.
+        shard_size (int, optional): Size of regex shards to compile (with `matcher="regex"`). Defaults to 500.
+        matcher (str | AhoCorasick, optional): How to find the template substrings: "aho-corasick" (one pass per
+            document), "regex" (one pass per shard of `shard_size` substrings), or an automaton already built from
+            the templates. Defaults to "aho-corasick".
+        n_jobs (int, optional): Processes scanning chunks of documents in parallel; each receives the matcher once. Defaults to 1.
+        chunk_size (int, optional): Documents per task. Defaults to 1000.
 
     Returns:
         float: Template rate, a value between 0 and 1 indicating the fraction of texts that contain at least one template.
@@ -27,33 +137,41 @@ def template_rate(
     if templates is None:
         # get the templates if not passed in 
         templates = extract_patterns(data)
-    
-    matched_text = _gather_substrings(templates)
-    
-    if not matched_text: return 0.0
-        
-    regexes = _compile_regex_shards(matched_text, shard_size=shard_size)
-    match = sum(1 for doc in data if _has_any(doc, regexes))
+
+    scanner = _get_scanner(templates, matcher, shard_size, overlap=False)
+
+    if scanner is None: return 0.0
+
+    match = sum(_scan_chunks(_count_matching, data, scanner, n_jobs, chunk_size))
     
     return match / len(data)
 
 
 def templates_per_token(
-        data: List[str],
+        data: Union[List[str], Corpus],
         templates: Optional[Dict[str, Iterable[str]]] = None,
         shard_size: int = 500,
+        matcher: Union[str, AhoCorasick] = "aho-corasick",
+        n_jobs: int = 1,
+        chunk_size: int = 1000,
 ) -> List[float]:
     """ 
     Calculates the templates-per-token rate from https://arxiv.org/abs/2407.00211. 
     
     Args:
-        data (List[str]):  A list of strings to score.
+        data (List[str] | Corpus):  A list of strings to score.
         templates (dict, optional): Dictionary containing the templates extracted from the corpus. Defaults to None.
-        shard_size (int, optional): Size of regex shards to compile. Defaults to 500.
+        shard_size (int, optional): Size of regex shards to compile (with `matcher="regex"`). Defaults to 500.
+        matcher (str | AhoCorasick, optional): How to find the template substrings: "aho-corasick" (one pass per
+            document), "regex" (one pass per shard of `shard_size` substrings), or an automaton already built from
+            the templates. Defaults to "aho-corasick".
+        n_jobs (int, optional): Processes scanning chunks of documents in parallel; each receives the matcher once. Defaults to 1.
+        chunk_size (int, optional): Documents per task. Defaults to 1000.
 
 
     Returns:
-        List[float]: List of templates-per-token rates for each document in the corpus.
+        List[float]: List of templates-per-token rates for each document in the corpus, counting the
+        positions at which a template starts (with "regex", once per shard matching there).
     """
     if not data:
         return []
@@ -62,27 +180,134 @@ def templates_per_token(
     if templates is None:
         templates = extract_patterns(data)
 
-    substrings = _gather_substrings(templates)
-    if not substrings:
-        return [0.0] * len(data)
+    return list(streaming_templates_per_token(data, templates, shard_size=shard_size, matcher=matcher,
+                                              n_jobs=n_jobs, chunk_size=chunk_size))
 
-    # Use lookahead shards to count overlapping occurrences
-    shards = _compile_regex_shards(substrings, shard_size, overlap=True)
 
-    # Compute per-doc TPT
+def streaming_templates_per_token(
+        data: Union[Iterable[str], str, os.PathLike],
+        templates: Dict[str, Iterable[str]],
+        shard_size: int = 500,
+        matcher: Union[str, AhoCorasick] = "aho-corasick",
+        n_jobs: int = 1,
+        chunk_size: int = 1000,
+        key: str = 'text',
+) -> Iterator[float]:
+    """
+    Yields the templates-per-token rate of each document of an iterable or a file, in order, as chunks
+    of documents are scored, without loading the documents into memory.
+
+    Args:
+        data (Iterable[str] | str): Documents, or path to a `.jsonl` / text file with one document per line.
+        templates (dict): Templates to match, e.g. a `TemplateLibrary` mined from a reference corpus.
+        shard_size (int, optional): Size of regex shards to compile (with `matcher="regex"`). Defaults to 500.
+        matcher (str | AhoCorasick, optional): See `templates_per_token`. Defaults to "aho-corasick".
+        n_jobs (int, optional): Processes scanning chunks of documents in parallel; each receives the matcher once. Defaults to 1.
+        chunk_size (int, optional): Documents per task. Defaults to 1000.
+        key (str, optional): Field holding the document in JSONL objects. Defaults to 'text'.
+
+    Returns:
+        Iterator[float]: Templates-per-token rate of each document.
+    """
+    if templates is None:
+        raise ValueError("Templates are needed to score a stream of documents; mine them with `TemplateLibrary.mine`.")
+
+    documents = as_documents(data, key=key)
+    scanner = _get_scanner(templates, matcher, shard_size, overlap=True)
+    if scanner is None:
+        for _ in documents:
+            yield 0.0
+        return
+
+    for rates in _scan_chunks(_templates_per_token, documents, scanner, n_jobs, chunk_size):
+        yield from rates
+
+
+def _get_matcher(
+        templates: Dict[str, Iterable[str]],
+        matcher: Union[str, AhoCorasick]
+) -> AhoCorasick:
+    """ The automaton passed in, the library's own, or one built from the template substrings. """
+    if isinstance(matcher, AhoCorasick):
+        return matcher
+    if matcher == "aho-corasick" and isinstance(templates, TemplateLibrary):
+        return templates.matcher
+    if matcher != "aho-corasick":
+        raise ValueError(f"Unknown matcher {matcher!r}; choose 'aho-corasick' or 'regex'.")
+    return AhoCorasick(_gather_substrings(templates))
+
+
+Scanner = Union[AhoCorasick, List[re.Pattern]]
+
+
+def _get_scanner(
+        templates: Dict[str, Iterable[str]],
+        matcher: Union[str, AhoCorasick],
+        shard_size: int,
+        overlap: bool
+) -> Optional[Scanner]:
+    """ The matcher of the template substrings (regex shards or an automaton), or None if there are none. """
+    if matcher == "regex":
+        substrings = _gather_substrings(templates)
+        # Use lookahead shards to count overlapping occurrences
+        return _compile_regex_shards(substrings, shard_size, overlap=overlap) if substrings else None
+    automaton = _get_matcher(templates, matcher)
+    return automaton if len(automaton) else None
+
+
+def _count_matching(scanner: Scanner, documents: List[str]) -> int:
+    """ Number of documents containing a template. """
+    if isinstance(scanner, AhoCorasick):
+        return sum(1 for doc in documents if scanner.contains_any(doc))
+    return sum(1 for doc in documents if _has_any(doc, scanner))
+
+
+def _templates_per_token(scanner: Scanner, documents: List[str]) -> List[float]:
+    """ Templates-per-token rate of each document. """
+    if isinstance(scanner, AhoCorasick):
+        count = scanner.count_starts
+    else:
+        def count(doc: str) -> int:
+            # each match = one occurrence start
+            return sum(sum(1 for _ in rx.finditer(doc)) for rx in scanner)
+
     tpt: List[float] = []
-    for doc in data:
+    for doc in documents:
         word_count = len(doc.split())
-        if word_count == 0:
-            tpt.append(0.0)
-            continue
+        tpt.append(count(doc) / word_count if word_count else 0.0)
+    return tpt
 
-        occ = 0
-        for rx in shards:
-            occ += sum(1 for _ in rx.finditer(doc))  # each match = one occurrence start
-        tpt.append(occ / word_count)
 
-    return tpt
+def _scan_chunk(task: Tuple[Callable, List[str]]) -> Any:
+    fn, documents = task
+    return fn(worker_state()['scanner'], documents)
+
+
+def _scan_chunks(
+        fn: Callable[[Scanner, List[str]], Any],
+        documents: Iterable[str],
+        scanner: Scanner,
+        n_jobs: int,
+        chunk_size: int
+) -> Iterator[Any]:
+    """ Yields `fn(scanner, chunk)` for consecutive chunks of `documents`, in order, spread over `n_jobs` processes. """
+    documents = iter(documents)
+    chunks = iter(lambda: list(itertools.islice(documents, chunk_size)), [])
+
+    if n_jobs <= 1:
+        for chunk in chunks:
+            yield fn(scanner, chunk)
+        return
+
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=init_worker, initargs=({'scanner': scanner},)) as executor:
+        # keep a few chunks per worker in flight, so that streams are not read ahead entirely
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(_scan_chunk, (fn, chunk)))
+            if len(pending) >= 2 * n_jobs:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
 
 
 def _compile_regex_shards(
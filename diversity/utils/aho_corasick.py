@@ -0,0 +1,94 @@
+"""
+Aho-Corasick automaton: finds every (possibly overlapping) occurrence of many substrings
+in one pass over a text, however many substrings there are.
+
+The automaton only holds lists, dicts and tuples, so it pickles cheaply and can be built once
+and sent to worker processes.
+"""
+
+from typing import Iterable, Iterator, List, Set, Tuple
+
+
+class AhoCorasick:
+    """
+    Multi-substring matcher.
+
+    Example Usage:
+    >>> matcher = AhoCorasick(["he", "she", "hers"])
+    >>> list(matcher.iter("ushers"))
+    [(1, 1), (2, 0), (2, 2)]
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        """
+        Args:
+            patterns (Iterable[str]): Substrings to search for. Duplicates and empty strings are dropped.
+        """
+        self.patterns: List[str] = list(dict.fromkeys(p for p in patterns if p))
+
+        # trie transitions, failure links and the patterns (ids) ending at each state
+        goto = [{}]
+        outputs: List[Tuple[int, ...]] = [()]
+        for index, pattern in enumerate(self.patterns):
+            state = 0
+            for char in pattern:
+                nxt = goto[state].get(char)
+                if nxt is None:
+                    nxt = goto[state][char] = len(goto)
+                    goto.append({})
+                    outputs.append(())
+                state = nxt
+            outputs[state] += (index,)
+
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        for state in queue:  # breadth first, so failure targets are done first
+            for char, nxt in goto[state].items():
+                f = fail[state]
+                while f and char not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(char, 0)
+                outputs[nxt] += outputs[fail[nxt]]
+                queue.append(nxt)
+
+        self._goto = goto
+        self._fail = fail
+        self._outputs = outputs
+        self._lengths = [len(p) for p in self.patterns]
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+    def _ends(self, text: str) -> Iterator[Tuple[int, Tuple[int, ...]]]:
+        """ Yields (end position, ids of the patterns ending there) for every position with a match. """
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        state = 0
+        for i, char in enumerate(text):
+            nxt = goto[state].get(char)
+            while nxt is None and state:
+                state = fail[state]
+                nxt = goto[state].get(char)
+            state = nxt or 0
+            if outputs[state]:
+                yield i, outputs[state]
+
+    def iter(self, text: str) -> Iterator[Tuple[int, int]]:
+        """ Yields (start position, pattern id) of every occurrence, ordered by end position. """
+        lengths = self._lengths
+        for end, ids in self._ends(text):
+            for index in ids:
+                yield end - lengths[index] + 1, index
+
+    def contains_any(self, text: str) -> bool:
+        """ Whether any pattern occurs in `text`. """
+        for _ in self._ends(text):
+            return True
+        return False
+
+    def count_starts(self, text: str) -> int:
+        """ Number of distinct positions in `text` at which at least one pattern starts. """
+        return len({start for start, _ in self.iter(text)})
+
+    def matches(self, text: str) -> Set[str]:
+        """ The patterns that occur in `text`. """
+        return {self.patterns[index] for _, ids in self._ends(text) for index in ids}
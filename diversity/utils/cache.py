@@ -0,0 +1,67 @@
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from .hashing import content_hash
+
+
+class LRUCache:
+    """
+    Values keyed by a hash of a model name and a text, kept in memory (least recently used entries
+    are evicted past `max_entries`) in front of an optional persistent store. Subclasses add the
+    store by overriding `_load` and `_save`.
+    """
+
+    def __init__(self, max_entries: int):
+        """
+        Args:
+            max_entries (int): Values kept in memory.
+        """
+        self.max_entries = max_entries
+        self._memory: OrderedDict = OrderedDict()
+
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        return content_hash(f"{model}\0{text}")
+
+    def get(self, key: str) -> Optional[Any]:
+        return self.get_many([key]).get(key)
+
+    def put(self, key: str, value: Any) -> None:
+        self.put_many({key: value})
+
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """ Values of the cached keys among `keys`, from memory or else from the persistent store. """
+        found = {}
+        for key in keys:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                found[key] = self._memory[key]
+        missing = [key for key in keys if key not in found]
+        if missing:
+            for key, value in self._load(missing).items():
+                found[key] = value
+                self._remember(key, value)
+        return found
+
+    def put_many(self, items: Dict[str, Any]) -> None:
+        for key, value in items.items():
+            self._remember(key, value)
+        if items:
+            self._save(items)
+
+    def clear(self) -> None:
+        """ Empties the in-memory cache (the persistent store is kept). """
+        self._memory.clear()
+
+    def _remember(self, key: str, value: Any) -> None:
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _load(self, keys: List[str]) -> Dict[str, Any]:
+        """ Values of the stored keys among `keys`; nothing is stored by default. """
+        return {}
+
+    def _save(self, items: Dict[str, Any]) -> None:
+        """ Adds items to the persistent store; nothing is stored by default. """
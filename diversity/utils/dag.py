@@ -0,0 +1,136 @@
+"""
+A small scheduler for computations that depend on each other (a DAG), running independent
+nodes concurrently in a process pool.
+"""
+
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, NamedTuple, Optional, Set, Tuple
+
+from .workers import init_worker, local_worker, worker_state
+
+
+class Node(NamedTuple):
+    """
+    One computation: `fn(context, *results_of_deps, **kwargs)`.
+    If an `optional` node raises, its result and the results of the nodes depending on it are None.
+    """
+    fn: Callable
+    deps: Tuple[str, ...] = ()
+    kwargs: Dict[str, Any] = {}
+    optional: bool = False
+
+
+def _run(node: Node, args: Tuple) -> Tuple[Any, float]:
+    start = time.perf_counter()
+    result = node.fn(worker_state()['context'], *args, **node.kwargs)
+    return result, time.perf_counter() - start
+
+
+def closure(nodes: Dict[str, Node], targets: Iterable[str]) -> Set[str]:
+    """ Names of the target nodes and of every node they (indirectly) depend on. """
+    needed: Set[str] = set()
+    stack = list(targets)
+    while stack:
+        name = stack.pop()
+        if name not in needed:
+            needed.add(name)
+            stack.extend(nodes[name].deps)
+    return needed
+
+
+def run_graph(
+        nodes: Dict[str, Node],
+        context: Any,
+        n_jobs: int = 1,
+        on_start: Optional[Callable[[str], None]] = None,
+        on_error: Optional[Callable[[str, Exception], None]] = None,
+        targets: Optional[Iterable[str]] = None,
+        done: Optional[Dict[str, Any]] = None
+) -> Tuple[Dict[str, Any], Dict[str, float]]:
+    """ Runs every node once its dependencies are done.
+
+    Args:
+        nodes (Dict[str, Node]): Nodes by name; dependencies must be names of other nodes.
+        context (Any): First argument of every node (e.g. the corpus). Sent once to each worker process.
+        n_jobs (int, optional): Worker processes. With 1, nodes run in this process in the given order. Defaults to 1.
+        on_start (Callable, optional): Called with the name of each node when it starts.
+        on_error (Callable, optional): Called with the name and exception of each optional node that fails.
+        targets (Iterable[str], optional): Nodes to run, with the nodes they depend on. Defaults to all nodes.
+        done (Dict[str, Any], optional): Results of nodes that already ran (None for failed optional nodes),
+            which are not run again.
+
+    Returns:
+        Tuple[Dict[str, Any], Dict[str, float]]: Result of each node (including the `done` ones) and
+        running time (seconds) of each node that ran.
+    """
+    unknown = {d for node in nodes.values() for d in node.deps if d not in nodes}
+    if unknown:
+        raise ValueError(f"Unknown dependencies: {', '.join(sorted(unknown))}.")
+    if targets is not None:
+        nodes = {name: node for name, node in nodes.items() if name in closure(nodes, targets)}
+
+    results: Dict[str, Any] = {name: result for name, result in (done or {}).items() if name in nodes}
+    timings: Dict[str, float] = {}
+    failed = {name for name, result in results.items() if result is None and nodes[name].optional}
+
+    def ready(name: str) -> bool:
+        return name not in results and all(d in results for d in nodes[name].deps)
+
+    def skip_or_args(name: str) -> Optional[Tuple]:
+        """ Marks nodes depending on failed nodes as failed; returns the arguments of the others. """
+        if any(d in failed for d in nodes[name].deps):
+            results[name] = None
+            failed.add(name)
+            return None
+        return tuple(results[d] for d in nodes[name].deps)
+
+    def finish(name: str, outcome: Callable[[], Tuple[Any, float]]) -> None:
+        try:
+            results[name], timings[name] = outcome()
+        except Exception as e:
+            if not nodes[name].optional:
+                raise
+            results[name] = None
+            failed.add(name)
+            if on_error:
+                on_error(name, e)
+
+    if n_jobs <= 1:
+        with local_worker({'context': context}):
+            while len(results) < len(nodes):
+                pending = [name for name in nodes if ready(name)]
+                if not pending:
+                    raise ValueError("The dependencies of the nodes have a cycle.")
+                for name in pending:
+                    args = skip_or_args(name)
+                    if args is None:
+                        continue
+                    if on_start:
+                        on_start(name)
+                    finish(name, lambda: _run(nodes[name], args))
+        return results, timings
+
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=init_worker, initargs=({'context': context},)) as executor:
+        running = {}
+        while len(results) < len(nodes):
+            submitted = True
+            while submitted:
+                submitted = False
+                for name in nodes:
+                    if ready(name) and name not in running.values():
+                        submitted = True
+                        args = skip_or_args(name)
+                        if args is None:
+                            continue
+                        if on_start:
+                            on_start(name)
+                        running[executor.submit(_run, nodes[name], args)] = name
+            if not running:
+                if len(results) < len(nodes):
+                    raise ValueError("The dependencies of the nodes have a cycle.")
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                finish(running.pop(future), future.result)
+    return results, timings
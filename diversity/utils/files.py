@@ -0,0 +1,43 @@
+import json
+import os
+from pathlib import Path
+from typing import Iterable, Iterator, Union
+
+
+def iter_documents(
+        path: Union[str, os.PathLike],
+        key: str = 'text'
+) -> Iterator[str]:
+    """ Lazily reads documents from a file, one document per line.
+
+    Args:
+        path (str): A `.jsonl` file (each line a JSON string, or an object holding the document
+            under `key`) or a plain text file (each line a document).
+        key (str, optional): Field holding the document in JSONL objects. Defaults to 'text'.
+
+    Yields:
+        str: Documents, in file order.
+    """
+    path = Path(path)
+    is_jsonl = path.suffix in ('.jsonl', '.ndjson')
+
+    with path.open('r', encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if not is_jsonl:
+                yield line
+                continue
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            yield record if isinstance(record, str) else record[key]
+
+
+def as_documents(
+        data: Union[Iterable[str], str, os.PathLike],
+        key: str = 'text'
+) -> Iterable[str]:
+    """ Returns `data` itself, or the documents in it if `data` is a file path (see `iter_documents`). """
+    if isinstance(data, (str, os.PathLike)):
+        return iter_documents(data, key=key)
+    return data
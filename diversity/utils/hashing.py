@@ -0,0 +1,11 @@
+import hashlib
+
+
+def content_hash(text: str) -> str:
+    """ Stable (across processes and runs) hex digest of a text, used as a cache key. """
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def hash64(text: str) -> int:
+    """ Stable (across processes and runs) 64-bit hash of a text. """
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
@@ -0,0 +1,166 @@
+"""
+Integer-encoded n-gram helpers.
+
+Tokens are mapped to a dense int32 vocabulary and every n-gram is identified by a
+dense integer code, built from the code of its (n-1)-gram prefix and its last token.
+Two n-grams share a code if and only if they are equal, so n-gram statistics can be
+computed with NumPy (`np.unique`, `np.bincount`) instead of Python tuples and sets.
+
+When the whole corpus is not available at once (e.g. streaming), n-grams are instead
+identified by stable 64-bit hashes (`hash_tokens`, `hash_ngrams`).
+"""
+
+import functools
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .hashing import hash64
+
+
+def encode_tokens(
+        tokens: Iterable[str],
+        vocab: Optional[Dict[str, int]] = None,
+        count: int = -1
+) -> np.ndarray:
+    """ Maps tokens to integer ids, growing `vocab` with unseen tokens.
+
+    Args:
+        tokens (Iterable[str]): Tokens to encode.
+        vocab (Dict[str, int], optional): Token to id mapping, updated in place. Defaults to a new one.
+        count (int, optional): Number of tokens, if known, to preallocate the output. Defaults to -1.
+
+    Returns:
+        np.ndarray: int32 array of token ids.
+    """
+    if vocab is None:
+        vocab = {}
+    return np.fromiter((vocab.setdefault(t, len(vocab)) for t in tokens), dtype=np.int32, count=count)
+
+
+def encode_documents(
+        documents: Iterable[List[str]],
+        vocab: Optional[Dict[str, int]] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """ Encodes tokenized documents as one array of token ids.
+
+    Args:
+        documents (Iterable[List[str]]): Tokens of each document.
+        vocab (Dict[str, int], optional): Token to id mapping, updated in place. Defaults to a new one.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: int32 ids of all tokens, and the offsets of each document
+        in that array (document i is ids[offsets[i]:offsets[i + 1]]).
+    """
+    lengths = []
+
+    def tokens():
+        for doc_tokens in documents:
+            lengths.append(len(doc_tokens))
+            yield from doc_tokens
+
+    ids = encode_tokens(tokens(), vocab)
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return ids, offsets
+
+
+def _compact(codes: np.ndarray, size: int) -> np.ndarray:
+    """ Stores dense codes in the smallest unsigned dtype that can hold `size` values. """
+    return codes.astype(np.uint32 if size <= np.iinfo(np.uint32).max else np.uint64, copy=False)
+
+
+def next_ngram_codes(
+        prev_codes: np.ndarray,
+        ids: np.ndarray,
+        n: int
+) -> np.ndarray:
+    """ Extends (n-1)-gram codes to n-gram codes.
+
+    Args:
+        prev_codes (np.ndarray): Dense codes of the (n-1)-grams starting at each position of `ids`.
+        ids (np.ndarray): Token ids.
+        n (int): Size of the n-grams to build (at least 2).
+
+    Returns:
+        np.ndarray: Dense codes (0 to number of unique n-grams - 1) of the
+        len(ids) - n + 1 n-grams, indexed by start position.
+    """
+    total = len(ids) - n + 1
+    if total <= 0:
+        return np.zeros(0, dtype=np.uint32)
+
+    vocab_size = np.uint64(int(ids.max()) + 1)
+    keys = prev_codes[:total].astype(np.uint64) * vocab_size + ids[n - 1:].astype(np.uint64)
+
+    uniques, codes = np.unique(keys, return_inverse=True)
+    return _compact(codes.ravel(), len(uniques))
+
+
+def ngram_codes(ids: np.ndarray, n: int) -> np.ndarray:
+    """ Dense codes of every n-gram in a sequence of token ids. """
+    codes = ids
+    for i in range(2, n + 1):
+        codes = next_ngram_codes(codes, ids, i)
+    return codes
+
+
+def ngram_starts(offsets: np.ndarray, n: int) -> np.ndarray:
+    """ Start positions (in the array of token ids, see `encode_documents`) of the n-grams
+    within each document, in order. """
+    counts = np.maximum(np.diff(offsets) - n + 1, 0)
+    firsts = np.repeat(offsets[:-1] - (np.cumsum(counts) - counts), counts)
+    return firsts + np.arange(len(firsts))
+
+
+def doc_ngram_codes(
+        ids: np.ndarray,
+        offsets: np.ndarray,
+        n: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """ Dense codes of the n-grams within each document (n-grams never cross documents),
+    and the index of the document each n-gram belongs to (see `encode_documents`). """
+    counts = np.maximum(np.diff(offsets) - n + 1, 0)
+    return ngram_codes(ids, n)[ngram_starts(offsets, n)], np.repeat(np.arange(len(counts)), counts)
+
+
+def sorted_unique(values: np.ndarray) -> np.ndarray:
+    """ Sorted distinct values; a plain sort is much faster than `np.unique` on random 64-bit hashes. """
+    values = np.sort(values)
+    if len(values):
+        values = values[np.concatenate(([True], values[1:] != values[:-1]))]
+    return values
+
+
+def num_unique(codes: np.ndarray) -> int:
+    """ Number of distinct values in an array of dense codes (which cover 0 to max). """
+    return int(codes.max()) + 1 if len(codes) else 0
+
+
+_token_hash = functools.lru_cache(maxsize=1 << 20)(hash64)
+
+
+def hash_tokens(tokens: Iterable[str]) -> np.ndarray:
+    """ Stable (across processes and runs) 64-bit hashes of tokens. """
+    return np.fromiter(map(_token_hash, tokens), dtype=np.uint64)
+
+
+def _mix(x: np.ndarray) -> np.ndarray:
+    """ splitmix64 finalizer. """
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xBF58476D1CE4E5B9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def hash_ngrams(token_hashes: np.ndarray, n: int) -> np.ndarray:
+    """ 64-bit hashes of the len(token_hashes) - n + 1 n-grams, indexed by start position. """
+    total = len(token_hashes) - n + 1
+    if total <= 0:
+        return np.zeros(0, dtype=np.uint64)
+
+    hashes = np.full(total, n, dtype=np.uint64)
+    for k in range(n):
+        hashes = _mix(hashes ^ token_hashes[k:k + total])
+    return hashes
@@ -0,0 +1,34 @@
+"""
+State shared by the tasks of a process pool: set once per worker process by `init_worker`, the
+pool's initializer, instead of being sent with every task.
+
+>>> ProcessPoolExecutor(n_jobs, initializer=init_worker, initargs=({'reps': reps},))
+"""
+
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator
+
+_STATE: Dict[str, Any] = {}
+
+
+def init_worker(state: Dict[str, Any]) -> None:
+    """ Adds `state` to the worker state of this process. """
+    _STATE.update(state)
+
+
+def worker_state() -> Dict[str, Any]:
+    """ The worker state of this process. """
+    return _STATE
+
+
+@contextmanager
+def local_worker(state: Dict[str, Any]) -> Iterator[None]:
+    """ Sets `state` for tasks run in this process instead of a pool, and restores the previous values afterwards. """
+    previous = {key: _STATE[key] for key in state if key in _STATE}
+    init_worker(state)
+    try:
+        yield
+    finally:
+        for key in state:
+            _STATE.pop(key, None)
+        _STATE.update(previous)
@@ -0,0 +1,157 @@
+import gzip
+import importlib.util
+import lzma
+import os
+import random
+import sys
+import tempfile
+import unittest
+import zlib
+from unittest import mock
+
+from diversity import compression_ratio, document_compression_ratios
+from diversity.compression import COMPRESSORS, compression_ratios, register_compressor, windowed_compression_ratios
+
+
+def baseline_xz_ratio(data):
+  """ The file-based xz ratio of the original implementation. """
+  with tempfile.TemporaryDirectory() as tmp:
+    with open(os.path.join(tmp, 'original.txt'), 'w+') as f:
+      f.write(' '.join(data))
+    with lzma.open(os.path.join(tmp, 'compressed.xz'), 'wb') as f:
+      f.write(' '.join(data).encode('utf-8'))
+    return round(os.path.getsize(os.path.join(tmp, 'original.txt')) / os.path.getsize(os.path.join(tmp, 'compressed.xz')), 3)
+
+
+class CompressionRatioTest(unittest.TestCase):
+
+  def setUp(self):
+    rng = random.Random(0)
+    words = "the a cat dog sat on mat quick brown fox".split()
+    self.docs = [" ".join(rng.choices(words, k=rng.randint(1, 40))) for _ in range(11)]
+
+  def test_gzip(self):
+    # a single gzip stream; the original implementation gzipped the gzip output again (3.085 here)
+    self.assertEqual(compression_ratio(self.docs), 3.487)
+    data = ' '.join(self.docs).encode('utf-8')
+    self.assertEqual(compression_ratio(self.docs, chunk_size=16), round(len(data) / len(gzip.compress(data)), 3))
+
+  def test_xz_matches_baseline(self):
+    for docs in (self.docs, self.docs * 50, ["ünïcödé text"] * 3):
+      self.assertEqual(compression_ratio(docs, algorithm='xz'), baseline_xz_ratio(docs))
+
+  def test_single_pass_matches_separate_calls(self):
+    algorithms = ['gzip', 'xz', 'bz2']
+    self.assertEqual(compression_ratios(self.docs, algorithms=algorithms, chunk_size=64),
+                     {a: compression_ratio(self.docs, algorithm=a) for a in algorithms})
+
+  def test_register_compressor(self):
+    with self.assertRaises(ValueError):
+      compression_ratio(self.docs, algorithm='raw-deflate')
+    register_compressor('raw-deflate', lambda level, threads: zlib.compressobj(9, zlib.DEFLATED, -15))
+    try:
+      data = ' '.join(self.docs).encode('utf-8')
+      compressor = zlib.compressobj(9, zlib.DEFLATED, -15)
+      expected = round(len(data) / len(compressor.compress(data) + compressor.flush()), 3)
+      self.assertEqual(compression_ratio(self.docs, algorithm='raw-deflate'), expected)
+    finally:
+      del COMPRESSORS['raw-deflate']
+
+
+def installed(module):
+  return importlib.util.find_spec(module) is not None
+
+
+class BackendTest(unittest.TestCase):
+
+  def setUp(self):
+    rng = random.Random(1)
+    words = "the a cat dog sat on mat quick brown fox".split()
+    self.docs = [" ".join(rng.choices(words, k=rng.randint(1, 40))) for _ in range(200)]
+
+  def check_round_trip(self, algorithm, decompress, **kwargs):
+    """ The written file decompresses to the text, and the ratio is that of the file sizes. """
+    with tempfile.TemporaryDirectory() as tmp:
+      ratio = compression_ratio(self.docs, algorithm=algorithm, path=tmp, chunk_size=1000, **kwargs)
+      extension = COMPRESSORS[algorithm][1]
+      with open(os.path.join(tmp, f'compressed.{extension}'), 'rb') as f:
+        compressed = f.read()
+      original = ' '.join(self.docs).encode('utf-8')
+      self.assertEqual(decompress(compressed), original)
+      self.assertEqual(ratio, round(len(original) / len(compressed), 3))
+    return ratio
+
+  def test_level(self):
+    fast = self.check_round_trip('gzip', gzip.decompress, level=1)
+    best = self.check_round_trip('gzip', gzip.decompress, level=9)
+    self.assertLess(fast, best)
+    self.assertLess(compression_ratio(self.docs, algorithm='xz', level=0), compression_ratio(self.docs, algorithm='xz'))
+
+  @unittest.skipUnless(installed('zstandard'), "zstandard is not installed")
+  def test_zstd(self):
+    import zstandard
+    decompress = lambda data: zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    self.check_round_trip('zstd', decompress)
+    self.check_round_trip('zstd', decompress, level=19, threads=2)
+
+  @unittest.skipUnless(installed('lz4'), "lz4 is not installed")
+  def test_lz4(self):
+    import lz4.frame
+    self.check_round_trip('lz4', lz4.frame.decompress)
+
+  @unittest.skipUnless(installed('brotli'), "brotli is not installed")
+  def test_brotli(self):
+    import brotli
+    self.check_round_trip('brotli', brotli.decompress, level=5)
+
+  def test_missing_backend(self):
+    with mock.patch.dict(sys.modules, {'zstandard': None}):
+      with self.assertRaisesRegex(ImportError, r"pip install zstandard"):
+        compression_ratio(self.docs, algorithm='zstd')
+
+
+class WindowedCompressionTest(unittest.TestCase):
+
+  def setUp(self):
+    rng = random.Random(0)
+    words = "the a cat dog sat on mat quick brown fox".split()
+    self.docs = [" ".join(rng.choices(words, k=rng.randint(1, 40))) for _ in range(11)]
+
+  def test_windows_match_compression_ratio_of_slices(self):
+    # stride 3 does not divide the 11 documents: windows start at 0, 3, 6, 9 and the last ones are truncated
+    ratios = windowed_compression_ratios(self.docs, window=4, stride=3)
+    starts = range(0, len(self.docs), 3)
+    self.assertEqual(ratios, [compression_ratio(self.docs[s:s + 4]) for s in starts])
+    self.assertEqual(windowed_compression_ratios(self.docs, window=5, algorithm='bz2'),
+                     [compression_ratio(self.docs[s:s + 5], algorithm='bz2') for s in (0, 5, 10)])
+
+  def test_stride_larger_than_window(self):
+    # windows [0, 1], [3, 4], [6, 7], [9, 10]; the documents in between are skipped
+    ratios = windowed_compression_ratios(self.docs, window=2, stride=3)
+    self.assertEqual(ratios, [compression_ratio(self.docs[s:s + 2]) for s in range(0, len(self.docs), 3)])
+    self.assertEqual(len(windowed_compression_ratios(self.docs[:5], window=2, stride=3)), 2)
+
+  def test_documents_match_compression_ratio(self):
+    self.assertEqual(document_compression_ratios(self.docs), [compression_ratio([doc]) for doc in self.docs])
+
+  def test_prime(self):
+    prime = " ".join(self.docs[:5])
+
+    def primed_ratio(doc):
+      compressor = zlib.compressobj(9, zlib.DEFLATED, 31)
+      compressor.compress(prime.encode('utf-8'))
+      compressor.flush(zlib.Z_SYNC_FLUSH)
+      encoded = doc.encode('utf-8')
+      return round(len(encoded) / len(compressor.compress(encoded) + compressor.flush()), 3)
+
+    ratios = document_compression_ratios(self.docs, prime=prime)
+    self.assertEqual(ratios, [primed_ratio(doc) for doc in self.docs])
+    # documents the compressor has already seen compress better
+    unprimed = document_compression_ratios(self.docs)
+    self.assertTrue(all(p > u for p, u in zip(ratios[:5], unprimed[:5])))
+    with self.assertRaises(ValueError):
+      document_compression_ratios(self.docs, algorithm='bz2', prime=prime)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,29 @@
+import unittest
+
+from diversity import compute_all_metrics
+
+
+class ComputeAllMetricsTest(unittest.TestCase):
+
+  TEXTS = ["the cat sat on the mat", "the cat sat on a mat", "a dog sat on the mat today"]
+
+  def test_metric_subset(self):
+    results = compute_all_metrics(self.TEXTS, metrics=["compression_ratio_gzip", "ngram_diversity"], verbose=False)
+    self.assertEqual(set(results), {"compression_ratio_gzip", "ngram_diversity", "timings"})
+    self.assertEqual(set(results["timings"]), {"compression", "ngram_diversity", "total"})
+    with self.assertRaises(ValueError):
+      compute_all_metrics(self.TEXTS, metrics=["unknown"], verbose=False)
+
+  def test_lazy_results_compute_on_access(self):
+    results = compute_all_metrics(self.TEXTS, metrics=["compression", "self_repetition"], lazy=True, verbose=False)
+    self.assertEqual(results.computed(), [])
+    ratio = results["compression_ratio_gzip"]
+    self.assertEqual(results.computed(), ["compression_ratio_gzip"])
+    self.assertEqual(results["compression_ratio_gzip"], ratio)
+    eager = compute_all_metrics(self.TEXTS, metrics=["compression", "self_repetition"], verbose=False)
+    self.assertEqual({k: v for k, v in results.compute().items() if k != "timings"},
+                     {k: v for k, v in eager.items() if k != "timings"})
+
+
+if __name__ == "__main__":
+  unittest.main()
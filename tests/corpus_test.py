@@ -0,0 +1,82 @@
+import random
+import unittest
+
+import nltk
+from diversity import (Corpus, compression_ratio, extract_patterns, ngram_diversity_score,
+                       self_repetition_score, token_patterns)
+
+
+def _has_punkt():
+  try:
+    nltk.data.find('tokenizers/punkt_tab/english/')
+    return True
+  except LookupError:
+    return False
+
+
+class CorpusTest(unittest.TestCase):
+
+  def setUp(self):
+    rng = random.Random(0)
+    words = "the a cat dog sat on mat".split()
+    self.docs = [" ".join(rng.choices(words, k=rng.randint(1, 12))) for _ in range(20)]
+
+  def test_memo_computes_once(self):
+    corpus = Corpus(self.docs)
+    calls = []
+    for _ in range(3):
+      self.assertEqual(corpus.memo('key', lambda: calls.append(1) or len(calls)), 1)
+    self.assertEqual(len(calls), 1)
+    corpus.clear()
+    self.assertEqual(corpus.memo('key', lambda: calls.append(1) or len(calls)), 2)
+
+  def test_metrics_match_list(self):
+    corpus = Corpus(self.docs)
+    for _ in range(2):  # the second round reads the cached representations
+      self.assertEqual(ngram_diversity_score(corpus), ngram_diversity_score(self.docs))
+      self.assertEqual(self_repetition_score(corpus, verbose=False), self_repetition_score(self.docs, verbose=False))
+      self.assertEqual(compression_ratio(corpus), compression_ratio(self.docs))
+
+  def test_word_ids_and_ngram_codes(self):
+    corpus = Corpus(self.docs)
+    words = " ".join(self.docs).split(" ")
+    ids = corpus.word_ids.tolist()
+    self.assertEqual(len(ids), len(words))
+    self.assertEqual([words[ids.index(i)] for i in ids], words)
+    self.assertEqual(len(set(ids)), len(set(words)))
+    for n in (1, 2, 4):
+      grams = [tuple(words[i:i + n]) for i in range(len(words) - n + 1)]
+      codes = corpus.ngram_codes(n).tolist()
+      self.assertEqual(len(codes), len(grams))
+      # equal codes exactly for equal n-grams
+      first = {}
+      for gram, code in zip(grams, codes):
+        self.assertEqual(first.setdefault(code, gram), gram)
+      self.assertEqual(len(first), len(set(grams)))
+
+  def test_extract_patterns_returns_a_copy(self):
+    corpus = Corpus(self.docs)
+    # stand-in tags, so the test does not need a spaCy model or punkt
+    tuples = [[(word, 'NN' if word in ('cat', 'dog', 'mat') else 'X') for word in doc.split()] for doc in self.docs]
+    corpus.memo('pos', lambda: ([" ".join(tag for _, tag in sent) for sent in tuples], tuples))
+    patterns = extract_patterns(corpus, n=2, top_n=3)
+    self.assertEqual(list(patterns), [p for p, _ in token_patterns(corpus.pos[0], 2, 3)])
+    expected = {pattern: set(matches) for pattern, matches in patterns.items()}
+    for matches in patterns.values():
+      matches.add("changed")
+    patterns.clear()
+    self.assertEqual(extract_patterns(corpus, n=2, top_n=3), expected)
+
+
+@unittest.skipUnless(_has_punkt(), "requires the NLTK punkt_tab tokenizer")
+class SentencesTest(unittest.TestCase):
+
+  def test_sentences_stay_within_documents(self):
+    corpus = Corpus(["The cat sat. It was happy", "the dog ran. Then it slept.", ""])
+    self.assertEqual(corpus.sentences, ["The cat sat.", "It was happy", "the dog ran.", "Then it slept."])
+    self.assertEqual(corpus.sentence_offsets.tolist(), [0, 2, 4, 4])
+    self.assertEqual(corpus.sentence_doc_ids.tolist(), [0, 0, 1, 1])
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+
+from diversity.utils.dag import Node, run_graph
+
+
+def add(context, *args, offset=0):
+  return context + sum(args) + offset
+
+
+def fail(context, *args):
+  raise RuntimeError("no model")
+
+
+class RunGraphTest(unittest.TestCase):
+
+  NODES = {
+    "a": Node(add),
+    "b": Node(add, ("a",), dict(offset=1)),
+    "c": Node(add, ("a", "b")),
+    "broken": Node(fail, optional=True),
+    "after_broken": Node(add, ("broken",), optional=True),
+  }
+
+  def test_results_in_dependency_order(self):
+    for n_jobs in (1, 2):
+      errors = []
+      results, timings = run_graph(self.NODES, 10, n_jobs=n_jobs, on_error=lambda name, e: errors.append(name))
+      self.assertEqual(results, {"a": 10, "b": 21, "c": 41, "broken": None, "after_broken": None})
+      self.assertEqual(set(timings), {"a", "b", "c"})
+      self.assertEqual(errors, ["broken"])
+
+  def test_required_failure_and_cycle(self):
+    with self.assertRaises(RuntimeError):
+      run_graph({"x": Node(fail)}, 0)
+    with self.assertRaises(ValueError):
+      run_graph({"x": Node(add, ("y",)), "y": Node(add, ("x",))}, 0)
+
+
+if __name__ == "__main__":
+  unittest.main()
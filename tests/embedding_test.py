@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from diversity import EmbeddingCache, get_embeddings
+from diversity import embedding
+
+
+class StubEncoder:
+  """ Stands in for a SentenceTransformer: embeds a text as [len(text), number of spaces]. """
+
+  def __init__(self):
+    self.encoded = []
+
+  def encode(self, texts, batch_size=64, show_progress_bar=False):
+    self.encoded.extend(texts)
+    return np.array([[len(t), t.count(' ')] for t in texts], dtype=np.float32)
+
+
+class EmbeddingCacheTest(unittest.TestCase):
+
+  def setUp(self):
+    self.encoder = embedding._MODELS['stub'] = StubEncoder()
+
+  def tearDown(self):
+    del embedding._MODELS['stub']
+
+  def test_hits_misses_and_eviction(self):
+    with tempfile.TemporaryDirectory() as tmp:
+      cache = EmbeddingCache(max_entries=2, cache_dir=tmp)
+      first = get_embeddings(["a b", "cd", "a b"], model='stub', verbose=False, cache=cache)
+      np.testing.assert_array_equal(first, [[3, 1], [2, 0], [3, 1]])
+      self.assertEqual(sorted(self.encoder.encoded), ["a b", "cd"])
+
+      # hits are not encoded again; only the new text is
+      get_embeddings(["cd", "efg"], model='stub', verbose=False, cache=cache)
+      self.assertEqual(sorted(self.encoder.encoded), ["a b", "cd", "efg"])
+      # "a b" was the least recently used entry, so only the disk store still has it
+      self.assertIsNone(cache._memory.get(cache.key('stub', "a b")))
+      self.assertEqual(len(os.listdir(tmp)), 3)
+
+      # a new cache on the same directory reuses the stored embeddings
+      again = get_embeddings(["a b", "efg"], model='stub', verbose=False, cache=EmbeddingCache(cache_dir=tmp))
+      np.testing.assert_array_equal(again, [[3, 1], [3, 0]])
+      self.assertEqual(len(self.encoder.encoded), 3)
+
+  def test_disk_eviction(self):
+    with tempfile.TemporaryDirectory() as tmp:
+      cache = EmbeddingCache(cache_dir=tmp, max_disk_bytes=1)
+      get_embeddings(["a", "b", "c"], model='stub', verbose=False, cache=cache)
+      self.assertLessEqual(len(os.listdir(tmp)), 1)
+
+
+class DistanceStatsTest(unittest.TestCase):
+
+  def test_matches_cosine_distances(self):
+    from sklearn.metrics.pairwise import cosine_distances
+    x = np.random.RandomState(0).randn(10, 5)
+    x[3] = x[7]  # duplicate rows have a minimum distance of 0
+    distances = cosine_distances(x)
+    expected_mean = distances.mean(axis=1)
+    expected_min = np.min(distances + np.eye(len(x)) * 1e9, axis=1)
+    for block_size in [1, 3, 4, 7, 10, 2048]:
+      for n_jobs in [1, 2]:
+        mean, mins = embedding._distance_stats(x, block_size=block_size, n_jobs=n_jobs)
+        np.testing.assert_allclose(mean, expected_mean, atol=1e-5)
+        np.testing.assert_allclose(mins, expected_min, atol=1e-5)
+
+  def test_single_embedding(self):
+    mean, mins = embedding._distance_stats(np.ones((1, 3)), block_size=4)
+    np.testing.assert_array_equal(mean, [0])
+    np.testing.assert_array_equal(mins, [1e9])
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,246 @@
+import collections
+import itertools
+import json
+import math
+import os
+import random
+import tempfile
+import unittest
+
+import numpy as np
+import torch
+from rouge_score import rouge_scorer
+from transformers import BertConfig, BertModel, BertTokenizer, RobertaConfig, RobertaModel, RobertaTokenizer
+from diversity import homogenization_score, sampled_homogenization_score, HomogenizationPool
+from diversity.similarity import BertScore, Bleu, RougeL, tokenize_13a
+
+
+def reference_rougel(data, use_stemmer):
+  scorer = rouge_scorer.RougeScorer(['rougeL'], use_stemmer=use_stemmer)
+  corpus_score = 0
+  for i, ref in enumerate(data):
+    preds = [x for j, x in enumerate(data) if j != i]
+    doc_score = sum([scorer.score(pred, ref)['rougeL'].fmeasure for pred in preds])
+    corpus_score += doc_score / (len(data) - 1)
+  if corpus_score == 0:
+    corpus_score += len(data)
+  return round(corpus_score / len(data), 3)
+
+
+def reference_bleu(reference, translations, max_order=4):
+  """ `compute_bleu` from the TensorFlow NMT code used by `evaluate`'s bleu, for a single reference. """
+  def counts(tokens):
+    return collections.Counter(tuple(tokens[k:k + n]) for n in range(1, max_order + 1)
+                               for k in range(len(tokens) - n + 1))
+
+  matches, possible = [0] * max_order, [0] * max_order
+  for translation in translations:
+    for ngram, count in (counts(translation) & counts(reference)).items():
+      matches[len(ngram) - 1] += count
+    for n in range(1, max_order + 1):
+      possible[n - 1] += max(len(translation) - n + 1, 0)
+  precisions = [m / p if p > 0 else 0.0 for m, p in zip(matches, possible)]
+  geo_mean = math.exp(sum((1. / max_order) * math.log(p) for p in precisions)) if min(precisions) > 0 else 0
+  ratio = sum(len(t) for t in translations) / (len(reference) * len(translations))
+  return geo_mean * (1. if ratio > 1.0 else math.exp(1 - 1. / ratio))
+
+
+class RougeLTest(unittest.TestCase):
+
+  WORDS = "the a cat dog running runs ran quick brown fox jumped over lazy ! , . 42".split()
+
+  def test_pair_scores_match_rouge_score(self):
+    rng = random.Random(0)
+    scorer = rouge_scorer.RougeScorer(['rougeL'], use_stemmer=True)
+    similarity = RougeL(use_stemmer=True)
+    texts = [" ".join(rng.choices(self.WORDS, k=rng.randint(0, 40))) for _ in range(20)]
+    reps = similarity.prepare(texts)
+    for _ in range(100):
+      i, j = rng.randrange(len(texts)), rng.randrange(len(texts))
+      expected = scorer.score(texts[i], texts[j])['rougeL'].fmeasure
+      self.assertEqual(similarity.score(reps[i], reps[j]), expected)
+
+  def test_homogenization_matches_all_pairs(self):
+    rng = random.Random(1)
+    data = [" ".join(rng.choices(self.WORDS, k=rng.randint(0, 30))) for _ in range(15)]
+    expected = reference_rougel(data, use_stemmer=False)
+    self.assertEqual(homogenization_score(data, verbose=False), expected)
+    self.assertEqual(homogenization_score(data, verbose=False, n_jobs=2), expected)
+
+  def test_identical_documents(self):
+    self.assertEqual(homogenization_score(["same text"] * 4, verbose=False), 1.0)
+
+
+class SampledHomogenizationTest(unittest.TestCase):
+
+  def setUp(self):
+    rng = random.Random(2)
+    words = RougeLTest.WORDS
+    self.data = [" ".join(rng.choices(words[:5] if k % 2 else words, k=20)) for k in range(60)]
+    self.exact = homogenization_score(self.data, verbose=False)
+
+  def test_interval_covers_exact_score(self):
+    for interval in ('clt', 'bootstrap'):
+      estimate = sampled_homogenization_score(self.data, max_pairs=3000, interval=interval,
+                                              num_bootstrap=200, seed=0, verbose=False)
+      self.assertLessEqual(estimate.lower, self.exact)
+      self.assertGreaterEqual(estimate.upper, self.exact)
+      self.assertEqual(estimate.num_pairs, 3000)
+
+  def test_early_stopping_and_strata(self):
+    estimate = sampled_homogenization_score(self.data, max_pairs=100000, tolerance=0.02, strata=[k % 2 for k in range(60)],
+                                            batch_pairs=200, seed=0, verbose=False)
+    self.assertLess(estimate.num_pairs, 100000)
+    self.assertLessEqual(estimate.upper - estimate.score, 0.021)
+    self.assertAlmostEqual(estimate.score, self.exact, delta=0.03)
+
+  def test_max_pairs_is_a_hard_budget(self):
+    strata = [k % 7 for k in range(60)]  # more strata than pairs per batch
+    for max_pairs, batch_pairs in [(250, 100), (101, 5), (20, 1000)]:
+      estimate = sampled_homogenization_score(self.data, max_pairs=max_pairs, strata=strata,
+                                              batch_pairs=batch_pairs, seed=0, verbose=False)
+      self.assertLessEqual(estimate.num_pairs, max_pairs)
+      self.assertEqual(estimate.num_pairs, max_pairs)
+
+
+class BleuTest(unittest.TestCase):
+
+  def test_tokenize_13a(self):
+    self.assertEqual(tokenize_13a('It costs $3.50, "quoted" &amp; 1-2.'),
+                     ['It', 'costs', '$', '3.50', ',', '"', 'quoted', '"', '&', '1', '-', '2', '.'])
+
+  def test_doc_scores_match_compute_bleu(self):
+    rng = random.Random(3)
+    words = "the a cat dog , . running ran quick brown fox".split()
+    for _ in range(20):
+      data = [" ".join(rng.choices(words[:rng.randint(2, len(words))], k=rng.randint(1, 15)))
+              for _ in range(rng.randint(2, 10))]
+      tokens = [tokenize_13a(d) for d in data]
+      expected = [reference_bleu(tokens[i], tokens[:i] + tokens[i + 1:]) for i in range(len(data))]
+      bleu = Bleu()
+      self.assertEqual(bleu.doc_scores(bleu.prepare(data)), expected)
+
+  def test_homogenization_matches_baseline_loop(self):
+    rng = random.Random(4)
+    words = "the a cat dog , . running ran quick brown fox".split()
+    for _ in range(10):
+      data = [" ".join(rng.choices(words, k=rng.randint(1, 15))) for _ in range(rng.randint(2, 8))]
+      tokens = [tokenize_13a(d) for d in data]
+      # the per-document loop of the original `evaluate`-based implementation
+      corpus_score = 0
+      for i in range(len(data)):
+        corpus_score += reference_bleu(tokens[i], tokens[:i] + tokens[i + 1:]) / (len(data) - 1)
+      if corpus_score == 0:
+        corpus_score += len(data)
+      self.assertEqual(homogenization_score(data, measure='bleu', verbose=False), round(corpus_score / len(data), 3))
+
+
+class HomogenizationPoolTest(unittest.TestCase):
+
+  def test_matches_query_rows_of_full_score(self):
+    rng = random.Random(4)
+    words = "the a cat dog".split()
+    data = [" ".join(rng.choices(words, k=rng.randint(3, 15))) for _ in range(25)]
+    pool, queries = data[:20], data[20:]
+
+    similarity = RougeL()
+    reps = similarity.prepare(data)
+    rows = [sum(similarity.score(reps[i], reps[j]) for j in range(len(data)) if j != i) / (len(data) - 1)
+            for i in range(20, 25)]
+    bleu = Bleu()
+    bleu_rows = [score / (len(data) - 1) for score in bleu.doc_scores(bleu.prepare(data))[20:]]
+
+    for measure, expected in (('rougel', rows), ('bleu', bleu_rows)):
+      reference = HomogenizationPool(pool[:5], measure=measure, verbose=False)
+      reference.add(pool[5:])
+      self.assertEqual(len(reference), 20)
+      self.assertAlmostEqual(reference.score(queries), round(sum(expected) / len(queries), 3))
+
+
+TINY_WORDS = "the a cat dog sat on mat ran quick brown fox jumped over lazy . ,".split()
+
+
+def set_weights(model, seed):
+  rng = np.random.RandomState(seed)
+  with torch.no_grad():
+    for _, param in sorted(model.named_parameters()):
+      param.copy_(torch.from_numpy(rng.normal(scale=0.3, size=tuple(param.shape)).astype(np.float32)))
+
+
+def tiny_bert(path):
+  """ A 2-layer BERT with a word-level vocabulary and at most 8 tokens per document. """
+  vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + TINY_WORDS
+  with open(os.path.join(path, 'vocab.txt'), 'w') as f:
+    f.write('\n'.join(vocab) + '\n')
+  BertTokenizer(os.path.join(path, 'vocab.txt'), model_max_length=8).save_pretrained(path)
+  model = BertModel(BertConfig(vocab_size=len(vocab), hidden_size=16, num_hidden_layers=2, num_attention_heads=2,
+                               intermediate_size=32, max_position_embeddings=16))
+  set_weights(model, 0)
+  model.save_pretrained(path)
+
+
+def tiny_roberta(path):
+  """ A 2-layer RoBERTa with a character-level byte BPE (no merges) and at most 16 tokens per document. """
+  tokens = ["<s>", "<pad>", "</s>", "<unk>", "<mask>"] + sorted(
+      set("Ġ" + w for w in TINY_WORDS) | set(TINY_WORDS) | set("".join(TINY_WORDS)) | {"Ġ"})
+  with open(os.path.join(path, 'vocab.json'), 'w') as f:
+    json.dump({t: i for i, t in enumerate(tokens)}, f)
+  with open(os.path.join(path, 'merges.txt'), 'w') as f:
+    f.write('#version: 0.2\n')
+  RobertaTokenizer(os.path.join(path, 'vocab.json'), os.path.join(path, 'merges.txt'),
+                   model_max_length=16).save_pretrained(path)
+  model = RobertaModel(RobertaConfig(vocab_size=len(tokens), hidden_size=16, num_hidden_layers=2, num_attention_heads=2,
+                                     intermediate_size=32, max_position_embeddings=20, pad_token_id=1))
+  set_weights(model, 1)
+  model.save_pretrained(path)
+
+
+class BertScoreTest(unittest.TestCase):
+
+  DOCS = ["  the cat sat on the mat .  ", "a quick brown fox jumped over the lazy dog", "the dog ran", "cat",
+          "the lazy cat sat on the quick brown dog , the fox ran over a mat ."]
+
+  # F1 of `bert_score.score` 0.3.13 (num_layers=1, batch_size=1) for the pairs of DOCS in
+  # itertools.combinations order, with the models built by `tiny_bert` and `tiny_roberta`
+  REFERENCES = {
+      'bert': [0.98913, 0.99147, 0.98941, 0.99533, 0.99161, 0.99564, 0.99281, 0.99291, 0.99275, 0.99373],
+      'roberta': [0.99904, 0.99909, 0.99805, 0.99932, 0.99868, 0.99780, 0.99866, 0.99802, 0.99876, 0.99826],
+  }
+
+  def test_matches_bert_score(self):
+    for name, build in [('bert', tiny_bert), ('roberta', tiny_roberta)]:
+      with tempfile.TemporaryDirectory() as tmp:
+        build(tmp)
+        similarity = BertScore(tmp, num_layers=1, batch_size=2)
+        reps = similarity.prepare(self.DOCS + [" "])
+        scores = [similarity.score(reps[i], reps[j]) for i, j in itertools.combinations(range(len(self.DOCS)), 2)]
+        np.testing.assert_allclose(scores, self.REFERENCES[name], atol=2e-5)
+        # an empty document only has the special tokens, which carry no weight
+        self.assertEqual(reps[-1][1].tolist(), [0, 0])
+        self.assertEqual(similarity.score(reps[0], reps[-1]), 0)
+
+  def test_greedy_matching_in_blocks(self):
+    rng = np.random.default_rng(0)
+    docs = []
+    for n in (5, 0, 3, 12, 1, 7, 2):
+      embeddings = rng.normal(size=(n, 8)).astype(np.float32)
+      embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+      weights = np.ones(n, dtype=np.float32)
+      weights[[0, -1][:n]] = 0  # special tokens are matched but not averaged
+      docs.append((embeddings, weights))
+
+    def f1(a, b):
+      if a[1].sum() == 0 or b[1].sum() == 0:
+        return 0.0
+      sim = a[0] @ b[0].T
+      p = np.average(sim.max(axis=1), weights=a[1])
+      r = np.average(sim.max(axis=0), weights=b[1])
+      return 2 * p * r / (p + r)
+
+    similarity = BertScore(block_tokens=8)
+    for a in docs:
+      np.testing.assert_allclose(similarity.score_many(a, docs), [f1(a, b) for b in docs], atol=1e-6)
+
+
+if __name__ == "__main__":
+  unittest.main()
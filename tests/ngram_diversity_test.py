@@ -0,0 +1,87 @@
+import unittest
+import nltk
+from diversity import ngram_diversity
+from diversity.utils import ngrams
+
+
+def reference_score(data, num_n):
+  words = ' '.join(data).split(' ')
+  score = 0
+  for i in range(1, num_n + 1):
+    grams = list(nltk.ngrams(words, i))
+    score += len(set(grams)) / len(grams)
+  return round(score, 3)
+
+
+class NgramCodesTest(unittest.TestCase):
+
+  def test_equal_ngrams_share_codes(self):
+    ids = ngrams.encode_tokens("a b a b c".split())
+    codes = ngrams.ngram_codes(ids, 2)
+    # "a b", "b a", "a b", "b c"
+    self.assertEqual(len(codes), 4)
+    self.assertEqual(codes[0], codes[2])
+    self.assertEqual(ngrams.num_unique(codes), 3)
+
+  def test_sequence_shorter_than_n(self):
+    ids = ngrams.encode_tokens(["a", "b"])
+    self.assertEqual(len(ngrams.ngram_codes(ids, 3)), 0)
+
+
+class NgramDiversityTest(unittest.TestCase):
+
+  def test_matches_reference_implementation(self):
+    data = [
+        "the cat sat on the mat",
+        "the cat sat on a hat  today",
+        "",
+        "a hat a hat a hat",
+    ]
+    for num_n in range(1, 5):
+      self.assertEqual(
+          ngram_diversity.ngram_diversity_score(data, num_n),
+          reference_score(data, num_n),
+      )
+
+  def test_ngrams_cross_document_boundaries(self):
+    # "b a" only exists across the two documents
+    self.assertEqual(
+        ngram_diversity.ngram_diversity_score(["a b", "a b"], 2),
+        reference_score(["a b", "a b"], 2),
+    )
+
+
+class StreamingNgramDiversityTest(unittest.TestCase):
+
+  DATA = [
+      "the cat sat on the mat",
+      "the cat sat on a hat today",
+      "a hat a hat a hat",
+      "the mat sat on the cat",
+  ]
+
+  def test_exact_mode_matches_in_memory_score(self):
+    expected = ngram_diversity.ngram_diversity_score(self.DATA)
+    for batch_size in (1, 3, 10):
+      self.assertEqual(
+          ngram_diversity.streaming_ngram_diversity_score(
+              iter(self.DATA), batch_size=batch_size),
+          expected,
+      )
+
+  def test_exact_mode_with_spilling(self):
+    self.assertEqual(
+        ngram_diversity.streaming_ngram_diversity_score(
+            self.DATA, batch_size=1, max_keys=2, partition_bits=2),
+        ngram_diversity.ngram_diversity_score(self.DATA),
+    )
+
+  def test_approx_mode_is_close(self):
+    score = ngram_diversity.streaming_ngram_diversity_score(
+        self.DATA, mode="approx")
+    self.assertAlmostEqual(
+        score, ngram_diversity.ngram_diversity_score(self.DATA), delta=0.05)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,58 @@
+import os
+import random
+import tempfile
+import unittest
+
+from diversity import PairwiseScoreStore, homogenization_score
+
+
+class PairwiseScoreStoreTest(unittest.TestCase):
+
+  def test_symmetric_and_ordered_pairs(self):
+    store = PairwiseScoreStore()
+    store.put('m', 'b', 'a', score=0.5)
+    store.put('m', 'c', 'a', payload='{"x": 1}', symmetric=False)
+    self.assertEqual(store.get('m', 'a', 'b'), (0.5, None))
+    self.assertEqual(store.get('m', 'c', 'a', symmetric=False), (None, '{"x": 1}'))
+    self.assertIsNone(store.get('m', 'a', 'c', symmetric=False))
+    self.assertIsNone(store.get('other', 'a', 'b'))
+    self.assertEqual(store.nearest('m', k=5), [('a', 'b', 0.5)])
+
+  def test_known_pairs_with_duplicate_documents(self):
+    store = PairwiseScoreStore()
+    store.put_many('m', [('x', 'y', 0.1, None), ('x', 'x', 1.0, None)])
+    hashes = ['x', 'y', 'x', 'z']
+    self.assertEqual(list(store.known_pairs('m', hashes)), [(0, 1, 0.1), (0, 2, 1.0), (1, 2, 0.1)])
+    self.assertEqual(list(store.known_pairs('m', hashes, rows=range(1, 4))), [(1, 2, 0.1)])
+    self.assertEqual(store.known_counts('m', hashes), {0: 2, 1: 2, 2: 2})
+
+
+class StoredHomogenizationTest(unittest.TestCase):
+
+  def test_reruns_reuse_stored_pairs(self):
+    rng = random.Random(5)
+    words = "the a cat dog , . running ran quick brown fox".split()
+    data = [" ".join(rng.choices(words, k=rng.randint(0, 20))) for _ in range(30)]
+    data[3] = data[4]
+    expected = homogenization_score(data, verbose=False)
+
+    with tempfile.TemporaryDirectory() as tmp:
+      path = os.path.join(tmp, 'scores.sqlite')
+      with PairwiseScoreStore(path) as store:
+        homogenization_score(data[:15], verbose=False, store=store)
+        self.assertEqual(homogenization_score(data, verbose=False, store=store), expected)
+        size = len(store)
+      with PairwiseScoreStore(path) as store:
+        self.assertEqual(len(store), size)
+        self.assertEqual(homogenization_score(data[::-1], verbose=False, store=store),
+                         homogenization_score(data[::-1], verbose=False))
+        self.assertEqual(len(store), size)
+
+  def test_bleu_rejects_store(self):
+    with PairwiseScoreStore() as store:
+      with self.assertRaises(ValueError):
+        homogenization_score(["a b", "b c"], measure='bleu', verbose=False, store=store)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -1,7 +1,22 @@
+import os
+import tempfile
 from typing import List, Tuple
 import unittest
+
+import spacy
+from spacy.language import Language
 from diversity.patterns import part_of_speech
 
+TAGGED = []
+
+
+@Language.component("test_tagger")
+def _test_tagger(doc):
+  TAGGED.append(doc.text)
+  for token in doc:
+    token.tag_ = "NN" if token.is_alpha else "."
+  return doc
+
 
 # Mock data for unit testing pos_patterns without SpaCy
 def create_pos_tuples(
@@ -81,6 +96,38 @@ class PartOfSpeechTest(unittest.TestCase):
     matches = part_of_speech.pos_patterns(data, "JJ SPACE NN")
     self.assertEqual(matches, {"long \t sentence"})
 
+  def test_pos_patterns_many_matches_each_pattern(self):
+    data = create_pos_tuples(["A cat and a dog", "The big dog ran"], ["DT NN CC DT NN", "DT JJ NN VBD"])
+    patterns = ["DT NN", "NN VBD", "DT JJ NN", "NN NN"]
+    matches = part_of_speech.pos_patterns_many(data, patterns)
+    self.assertEqual(matches, {p: part_of_speech.pos_patterns(data, p) for p in patterns})
+    self.assertEqual(matches["DT NN"], {"A cat", "a dog"})
+    self.assertEqual(matches["DT JJ NN"], {"The big dog"})
+
+
+class GetPosTest(unittest.TestCase):
+
+  def test_tags_are_cached_per_sentence(self):
+    with tempfile.TemporaryDirectory() as tmp:
+      model = os.path.join(tmp, "pipeline")
+      nlp = spacy.blank("en")
+      nlp.add_pipe("test_tagger", name="tagger")
+      nlp.to_disk(model)
+      path = os.path.join(tmp, "tags.sqlite")
+      TAGGED.clear()
+
+      cache = part_of_speech.PosCache(path)
+      joined, tuples = part_of_speech.get_pos(["A cat .", "A dog .", "A cat ."], model=model, cache=cache)
+      self.assertEqual(joined, ["NN NN .", "NN NN .", "NN NN ."])
+      self.assertEqual(tuples[1], [("A", "NN"), ("dog", "NN"), (".", ".")])
+      self.assertEqual(TAGGED, ["A cat .", "A dog ."])
+
+      # a new process (fresh memory) reads the tags from disk and only tags new sentences
+      again = part_of_speech.get_pos(["A dog .", "A bird ."], model=model, cache=part_of_speech.PosCache(path))
+      self.assertEqual(again[0], ["NN NN .", "NN NN ."])
+      self.assertEqual(TAGGED, ["A cat .", "A dog .", "A bird ."])
+      self.assertIs(part_of_speech.get_pipeline(model), part_of_speech.get_pipeline(model))
+
 
 if __name__ == "__main__":
   unittest.main()
@@ -0,0 +1,94 @@
+import os
+import tempfile
+import unittest
+from collections import Counter
+
+import numpy as np
+from nltk.util import ngrams
+from diversity import self_repetition
+
+
+def reference_score(dataset, n):
+  ngram_docs = [
+      list(set(" ".join(ngram) for ngram in ngrams(doc.split(), n)))
+      for doc in dataset
+  ]
+  ngram_counts = Counter(g for doc in ngram_docs for g in doc)
+  total_sum = 0
+  for ngram_doc in ngram_docs:
+    sum_ni = sum(ngram_counts[g] for g in ngram_doc) - len(ngram_doc)
+    total_sum += np.log(sum_ni + 1)
+  return total_sum / len(dataset)
+
+
+class SelfRepetitionTest(unittest.TestCase):
+
+  DATA = [
+      "the cat sat on the mat",
+      "the cat sat on a hat today",
+      "",
+      "a hat a hat a hat",
+      "the  cat\nsat on the mat",
+  ]
+
+  def test_matches_reference_implementation(self):
+    for n in range(1, 5):
+      self.assertEqual(
+          self_repetition.self_repetition_score(self.DATA, n, verbose=False),
+          reference_score(self.DATA, n),
+      )
+
+  def test_ngrams_do_not_cross_documents(self):
+    # "b c" would only exist across the document boundary
+    self.assertEqual(
+        self_repetition.self_repetition_score(["a b", "c d", "b c"], 2,
+                                              verbose=False),
+        0.0,
+    )
+
+  def test_no_repetition_scores_zero(self):
+    self.assertEqual(
+        self_repetition.self_repetition_score(["a b c", "d e f"], 2,
+                                              verbose=False),
+        0.0,
+    )
+
+
+class SelfRepetitionIndexTest(unittest.TestCase):
+
+  DATA = SelfRepetitionTest.DATA
+
+  def test_incremental_add_matches_batch_score(self):
+    index = self_repetition.SelfRepetitionIndex(n=2)
+    index.add(self.DATA[:2])
+    score = index.add(self.DATA[2:])
+    self.assertAlmostEqual(score, reference_score(self.DATA, 2))
+
+  def test_remove_matches_score_without_documents(self):
+    index = self_repetition.SelfRepetitionIndex(n=2)
+    index.add(self.DATA + [self.DATA[0]])
+    score = index.remove([self.DATA[0], self.DATA[3]])
+    remaining = [self.DATA[0]] + self.DATA[1:3] + self.DATA[4:]
+    self.assertEqual(len(index), len(remaining))
+    self.assertAlmostEqual(score, reference_score(remaining, 2))
+
+  def test_remove_unknown_document_raises(self):
+    index = self_repetition.SelfRepetitionIndex(n=2)
+    index.add(self.DATA)
+    with self.assertRaises(KeyError):
+      index.remove(["not in the index"])
+
+  def test_save_and_load(self):
+    index = self_repetition.SelfRepetitionIndex(n=2)
+    index.add(self.DATA)
+    with tempfile.TemporaryDirectory() as tmp:
+      path = os.path.join(tmp, "index.pkl")
+      index.save(path)
+      loaded = self_repetition.SelfRepetitionIndex.load(path)
+    self.assertEqual(loaded.score(), index.score())
+    self.assertAlmostEqual(
+        loaded.add(["the cat sat"]), reference_score(self.DATA + ["the cat sat"], 2))
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,78 @@
+import gzip
+import os
+import pickle
+import random
+import tempfile
+import unittest
+
+from diversity import (AhoCorasick, TemplateLibrary, match_patterns, streaming_templates_per_token, template_rate,
+                       templates_per_token)
+
+
+class AhoCorasickTest(unittest.TestCase):
+
+  def test_overlapping_occurrences(self):
+    matcher = pickle.loads(pickle.dumps(AhoCorasick(["he", "she", "hers", "he"])))
+    self.assertEqual(sorted(matcher.iter("ushers")), [(1, 1), (2, 0), (2, 2)])
+    self.assertEqual(matcher.count_starts("ushers"), 2)
+    self.assertEqual(matcher.matches("ushers"), {"he", "she", "hers"})
+    self.assertFalse(matcher.contains_any("his"))
+
+  def test_agrees_with_regex_matcher(self):
+    rng = random.Random(0)
+    words = "the a cat dog sat on mat".split()
+    docs = [" ".join(rng.choices(words, k=rng.randint(0, 30))) for _ in range(30)]
+    templates = {"p%d" % k: {" ".join(rng.choices(words, k=rng.randint(1, 3))) for _ in range(5)} for k in range(8)}
+    for metric in (template_rate, templates_per_token):
+      self.assertEqual(metric(docs, templates), metric(docs, templates, matcher="regex"))
+
+  def test_parallel_and_streaming_scoring(self):
+    rng = random.Random(1)
+    words = "the a cat dog sat on mat".split()
+    docs = [" ".join(rng.choices(words, k=rng.randint(0, 30))) for _ in range(50)]
+    templates = {"p": {"the cat", "sat on", "a dog sat"}}
+    expected = templates_per_token(docs, templates)
+    for matcher in ("aho-corasick", "regex"):
+      self.assertEqual(templates_per_token(docs, templates, matcher=matcher, n_jobs=2, chunk_size=7), expected)
+      self.assertEqual(template_rate(docs, templates, matcher=matcher, n_jobs=2, chunk_size=7),
+                       template_rate(docs, templates))
+    with tempfile.TemporaryDirectory() as tmp:
+      path = os.path.join(tmp, "docs.txt")
+      with open(path, "w") as f:
+        f.write("\n".join(docs) + "\n")
+      self.assertEqual(list(streaming_templates_per_token(path, templates, chunk_size=9)), expected)
+
+  def test_match_patterns(self):
+    patterns = {"DT NN": {"the cat", "a dog"}, "NN VBD": {"cat sat"}}
+    self.assertEqual(sorted(match_patterns("the cat sat", patterns)), [("DT NN", "the cat"), ("NN VBD", "cat sat")])
+
+
+class TemplateLibraryTest(unittest.TestCase):
+
+  TEMPLATES = {"DT NN": {"the cat", "a dog"}, "NN VBD": {"cat sat"}}
+  DOCS = ["the cat sat on the mat", "no templates here", "a dog and the cat"]
+
+  def test_save_and_load(self):
+    library = TemplateLibrary(self.TEMPLATES, n=2)
+    with tempfile.TemporaryDirectory() as tmp:
+      path = os.path.join(tmp, "templates.pkl.gz")
+      library.save(path)
+      loaded = TemplateLibrary.load(path)
+    self.assertEqual(dict(loaded), self.TEMPLATES)
+    self.assertEqual(loaded.n, 2)
+    self.assertEqual(loaded.template_rate(self.DOCS), template_rate(self.DOCS, templates=self.TEMPLATES))
+    self.assertEqual(templates_per_token(self.DOCS, templates=loaded),
+                     templates_per_token(self.DOCS, templates=self.TEMPLATES))
+    self.assertEqual(sorted(loaded.match(self.DOCS[0])), [("DT NN", "the cat"), ("NN VBD", "cat sat")])
+
+  def test_rejects_other_versions(self):
+    with tempfile.TemporaryDirectory() as tmp:
+      path = os.path.join(tmp, "templates.pkl.gz")
+      with gzip.open(path, "wb") as f:
+        pickle.dump({"version": TemplateLibrary.VERSION + 1}, f)
+      with self.assertRaises(ValueError):
+        TemplateLibrary.load(path)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -94,6 +94,18 @@ class TokenPatternsTest(unittest.TestCase):
     self.assertEqual(patterns_dict.get("cat"), 1)
     self.assertEqual(patterns_dict.get("Cat"), 1)
 
+  def test_ties_keep_first_occurrence_order(self):
+    """Test that equally frequent patterns are listed in order of first appearance."""
+    data = ["C D A B", "A B C D", "E F"]
+    self.assertEqual(Token.token_patterns(data, 2, top_n=3), [("C D", 2), ("A B", 2), ("D A", 1)])
+
+  def test_streaming_matches_batch(self):
+    """Test that counting sentences in batches gives the same top patterns."""
+    data = ["A B C", "A B D", "B C A B", "D", "C A B C"]
+    for batch_size in (1, 2, 10):
+      self.assertEqual(Token.streaming_token_patterns(iter(data), 2, top_n=4, batch_size=batch_size),
+                       Token.token_patterns(data, 2, top_n=4))
+
 
 if __name__ == "__main__":
   unittest.main()